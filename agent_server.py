@@ -5,8 +5,15 @@ Simple HTTP API server for Flub Agent
 Provides a REST API that the TypeScript iMessage watcher can call.
 Much more efficient than spawning Python processes.
 
+Runs on FastAPI/Uvicorn with an async agent, so slow LLM calls for different
+senders overlap on one event loop instead of each pinning a worker thread.
+
 Usage:
     python agent_server.py
+    # or: uvicorn agent_server:app --host 0.0.0.0 --port 3000 --loop uvloop --http httptools
+
+Run a single worker: per-sender locks and queued session saves live in the
+process, and one event loop already keeps hundreds of LLM calls in flight.
 
 Then POST to http://localhost:3000/query with:
     {"sender": "+1234567890", "query": "What is the best flight from EWR to LAX?"}
@@ -14,33 +21,264 @@ Then POST to http://localhost:3000/query with:
 
 import sys
 import os
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+import asyncio
+import hashlib
+import logging
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+import httpx
+import ijson
+from cachetools import TTLCache
+import orjson
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
 
 # Add src to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-from src.simple_agent import SimpleFlubAgent
+from src.conversation import Conversation, TIME_SENSITIVE, stamp_message
+from src.session_store import SQLiteSessionStore
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app)
+logger = logging.getLogger(__name__)
+
+# One pooled HTTP client for the agent's Anthropic client, so requests reuse
+# warm keep-alive connections. HTTP/2 lets concurrent calls (summaries, tool
+# continuations, other senders) share a connection instead of opening more.
+http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+    timeout=httpx.Timeout(60.0, connect=5.0)
+)
+
 
-# Maintain separate agent instances per sender (conversation history)
-agents = {}
+def build_agent():
+    """Import and build the agent; the SDK and tool imports are the slow part."""
+    from src.simple_agent import SimpleFlubAgent
+    return SimpleFlubAgent(http_client=http_client)
 
 
-def get_agent_for_sender(sender: str) -> SimpleFlubAgent:
-    """Get or create agent instance for a sender."""
-    if sender not in agents:
-        agents[sender] = SimpleFlubAgent()
-    return agents[sender]
+async def get_agent():
+    """Get the shared agent, waiting for startup to finish building it."""
+    return await app.state.agent_task
 
 
-@app.route('/query', methods=['POST'])
-def query():
+async def warm_connection():
+    """
+    Open the pooled connection to the Anthropic API ahead of the first
+    message, so it doesn't wait on DNS and the TLS handshake. Listing one
+    model is the cheapest authenticated call.
+    """
+    try:
+        agent = await get_agent()
+        await agent.client.models.list(limit=1)
+    except Exception as e:
+        logger.warning("Connection warm-up failed: %s", e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the agent on startup and release resources on shutdown."""
+    # One stateless agent serves every sender; per-sender state lives in the store.
+    # It is built in the background, so the server (and /health) comes up
+    # without waiting on the agent's imports, yet the first message rarely
+    # pays for them.
+    app.state.agent_task = asyncio.create_task(run_in_threadpool(build_agent))
+    warmup = asyncio.create_task(warm_connection())
+    flusher = asyncio.create_task(flush_saves_periodically())
+    yield
+    warmup.cancel()
+    flusher.cancel()
+    await flush_saves()
+    await http_client.aclose()
+    store.close()
+
+
+app = FastAPI(title="Flub Agent API", lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+
+# Conversations live in SQLite so they survive restarts and nothing
+# per-sender is kept in memory between requests
+store = SQLiteSessionStore(os.environ.get("SESSION_DB_PATH", "sessions.db"))
+
+# Per-sender locks so bursts from one sender run one at a time while other
+# senders stay parallel. Entries disappear once nothing holds or awaits them.
+sender_locks = weakref.WeakValueDictionary()
+
+# Conversations waiting to be written, keyed by sender (latest state wins).
+# Saves are batched into one transaction every SAVE_FLUSH_INTERVAL seconds,
+# or sooner once SAVE_FLUSH_BATCH senders are waiting, so no response waits
+# on disk I/O. Entries stay here until written, and loads check here first.
+SAVE_FLUSH_INTERVAL = 0.1
+SAVE_FLUSH_BATCH = 64
+pending_saves: dict[str, tuple[list, str]] = {}
+save_wakeup = asyncio.Event()
+flush_lock = asyncio.Lock()
+
+# First messages currently being answered, keyed by normalized query hash.
+# A sender with no history gets a sender-independent answer, so identical
+# first messages (e.g. "what's trending?" during a big event) share one call.
+first_message_tasks: dict[str, asyncio.Task] = {}
+# Recently answered first messages, reused for a few minutes after the
+# answer arrives. Answers about the date or time, or built from tool results
+# (prices, trends), go stale, so those are only shared while in flight.
+first_message_answers = TTLCache(maxsize=512, ttl=300)
+
+# Cap in-flight items per batch so one backlog flush can't monopolize the
+# server; further items wait (and stop being read) until a slot frees up
+MAX_BATCH_IN_FLIGHT = 64
+
+
+class QueryIn(BaseModel):
+    sender: str
+    query: str
+
+
+class ClearIn(BaseModel):
+    sender: str
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_error(request: Request, exc: RequestValidationError):
+    """Keep the {"success": false, "error": ...} envelope the watcher expects."""
+    missing = ", ".join(f"'{err['loc'][-1]}'" for err in exc.errors())
+    return ORJSONResponse(
+        status_code=400,
+        content={"success": False, "error": f"Missing or invalid fields: {missing}"}
+    )
+
+
+def load_conversation(sender: str) -> Conversation:
+    """Load a sender's conversation, including a save that hasn't been flushed yet."""
+    pending = pending_saves.get(sender)
+    if pending is not None:
+        messages, summary = pending
+        return Conversation(messages=list(messages), summary=summary)
+    messages, summary = store.load(sender)
+    return Conversation(messages=messages, summary=summary)
+
+
+def queue_save(sender: str, conversation: Conversation):
+    """
+    Queue a sender's conversation to be written by the background flusher.
+
+    Trimmed to complete turns the way the store trims it, so a turn that
+    errored before its reply isn't served back by load_conversation.
+    """
+    pending_saves[sender] = (store._complete_turns(conversation.messages), conversation.summary)
+    if len(pending_saves) >= SAVE_FLUSH_BATCH:
+        save_wakeup.set()
+
+
+async def flush_saves():
+    """Write every queued conversation in one transaction."""
+    async with flush_lock:
+        batch = dict(pending_saves)
+        if not batch:
+            return
+        await run_in_threadpool(store.save_many, batch.items())
+        # Keep entries that were replaced by a newer save during the write
+        for sender, state in batch.items():
+            if pending_saves.get(sender) is state:
+                del pending_saves[sender]
+
+
+async def flush_saves_periodically():
+    """Background task that flushes queued saves."""
+    while True:
+        try:
+            await asyncio.wait_for(save_wakeup.wait(), SAVE_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        save_wakeup.clear()
+        try:
+            await flush_saves()
+        except Exception:
+            # Entries stay queued, so the next tick retries them
+            logger.exception("Session flush failed")
+
+
+async def answer_fresh(agent, query: str) -> Conversation:
+    """Answer a query in a new, empty conversation."""
+    conversation = Conversation()
+    await agent.respond(query, conversation)
+    return conversation
+
+
+async def answer_first_message(agent, query: str) -> Conversation:
+    """
+    Answer a first message, reusing a recent answer to the same message or
+    joining an identical one in flight.
+    """
+    key = hashlib.blake2b(" ".join(query.lower().split()).encode(), digest_size=16).hexdigest()
+    answered = first_message_answers.get(key)
+    if answered is not None:
+        return answered
+
+    task = first_message_tasks.get(key)
+    if task is None:
+        task = asyncio.create_task(answer_fresh(agent, query))
+        first_message_tasks[key] = task
+
+        def finished(task: asyncio.Task):
+            del first_message_tasks[key]
+            if task.cancelled() or task.exception() is not None:
+                return
+            if not TIME_SENSITIVE.search(query) and not task.result().used_tools:
+                first_message_answers[key] = task.result()
+
+        task.add_done_callback(finished)
+
+    # Shielded so one caller disconnecting doesn't cancel the others' answer
+    return await asyncio.shield(task)
+
+
+async def run_turn(sender: str, query: str) -> str:
+    """Answer one query for a sender and persist the updated conversation."""
+    agent = await get_agent()
+    # SQLite reads block, so they run in the threadpool; the LLM call is awaited
+    conversation = await run_in_threadpool(load_conversation, sender)
+    if conversation.messages or conversation.summary:
+        response = await agent.respond(query, conversation)
+    else:
+        answered = await answer_first_message(agent, query)
+        # The shared answer carries the first asker's stamp; use this sender's
+        conversation.messages += [{"role": "user", "content": stamp_message(query)}]
+        conversation.messages += answered.messages[1:]
+        conversation.summary = answered.summary
+        response = answered.messages[-1]["content"]
+    queue_save(sender, conversation)
+    return response
+
+
+async def stream_turn(sender: str, query: str) -> AsyncIterator[str]:
+    """Stream the answer to one query for a sender, then persist the conversation."""
+    agent = await get_agent()
+    conversation = await run_in_threadpool(load_conversation, sender)
+    async for chunk in agent.stream(query, conversation):
+        yield chunk
+    queue_save(sender, conversation)
+
+
+def get_sender_lock(sender: str) -> asyncio.Lock:
+    """Get the processing lock for a sender, creating it if needed."""
+    lock = sender_locks.get(sender)
+    if lock is None:
+        lock = asyncio.Lock()
+        sender_locks[sender] = lock
+    return lock
+
+
+@app.post('/query')
+async def query(body: QueryIn):
     """
     Process a query from a sender.
 
@@ -56,41 +294,141 @@ def query():
             "response": "The best flight is..."
         }
     """
+    if not body.sender or not body.query:
+        return ORJSONResponse(status_code=400, content={
+            "success": False,
+            "error": "Both 'sender' and 'query' are required"
+        })
+
     try:
-        data = request.json
+        async with get_sender_lock(body.sender):
+            response = await run_turn(body.sender, body.query)
 
-        if not data:
-            return jsonify({"success": False, "error": "No JSON body provided"}), 400
+        return {
+            "success": True,
+            "response": response
+        }
 
-        sender = data.get('sender')
-        query = data.get('query')
+    except Exception as e:
+        return ORJSONResponse(status_code=500, content={
+            "success": False,
+            "error": str(e)
+        })
 
-        if not sender or not query:
-            return jsonify({
-                "success": False,
-                "error": "Both 'sender' and 'query' are required"
-            }), 400
 
-        # Get agent for this sender
-        agent = get_agent_for_sender(sender)
+@app.post('/query_stream')
+async def query_stream(body: QueryIn):
+    """
+    Process a query and stream the response as Server-Sent Events.
 
-        # Process the query
-        response = agent.process(query)
+    Body:
+        {
+            "sender": "+1234567890",
+            "query": "What is the best flight from EWR to LAX?"
+        }
 
-        return jsonify({
-            "success": True,
-            "response": response
+    Returns:
+        text/event-stream of `data: {"chunk": "..."}` events, ending with
+        `data: {"done": true}`, or with `data: {"error": "..."}` if the
+        turn could not be run
+    """
+    if not body.sender or not body.query:
+        return ORJSONResponse(status_code=400, content={
+            "success": False,
+            "error": "Both 'sender' and 'query' are required"
         })
 
-    except Exception as e:
-        return jsonify({
-            "success": False,
-            "error": str(e)
-        }), 500
+    lock = get_sender_lock(body.sender)
+
+    async def events():
+        try:
+            async with lock:
+                async for chunk in stream_turn(body.sender, body.query):
+                    yield b"data: " + orjson.dumps({"chunk": chunk}) + b"\n\n"
+        except Exception as e:
+            # The 200 status is already sent, so report the failure in-stream
+            logger.exception("Streaming query failed")
+            yield b"data: " + orjson.dumps({"error": str(e)}) + b"\n\n"
+            return
+        yield b"data: " + orjson.dumps({"done": True}) + b"\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
 
 
-@app.route('/clear', methods=['POST'])
-def clear_history():
+@app.post('/query_batch')
+async def query_batch(request: Request):
+    """
+    Process several queries in one request, e.g. when the watcher catches up
+    on a backlog. Items are processed concurrently, except that items from
+    the same sender run in order.
+
+    The body is parsed as it arrives, so the first item starts while later
+    ones are still uploading, and results are streamed back as NDJSON as
+    soon as each one finishes.
+
+    Body:
+        {
+            "items": [
+                {"sender": "+1234567890", "query": "..."},
+                ...
+            ]
+        }
+
+    Returns:
+        application/x-ndjson, one line per item in completion order:
+            {"index": 0, "success": true, "response": "..."}
+            {"index": 1, "success": false, "error": "..."}
+    """
+    results = asyncio.Queue()
+    slots = asyncio.Semaphore(MAX_BATCH_IN_FLIGHT)
+
+    async def process_item(index: int, raw: dict):
+        try:
+            item = QueryIn.model_validate(raw)
+            async with get_sender_lock(item.sender):
+                response = await run_turn(item.sender, item.query)
+            result = {"index": index, "success": True, "response": response}
+        except ValidationError as e:
+            missing = ", ".join(f"'{err['loc'][-1]}'" for err in e.errors() if err['loc']) or "'sender', 'query'"
+            result = {"index": index, "success": False, "error": f"Missing or invalid fields: {missing}"}
+        except Exception as e:
+            result = {"index": index, "success": False, "error": str(e)}
+        finally:
+            slots.release()
+        results.put_nowait(result)
+
+    async def dispatch():
+        # Tasks start in body order, and sender locks are FIFO, so one
+        # sender's items still run in the order they were sent
+        tasks = []
+        parsed = ijson.sendable_list()
+        parser = ijson.items_coro(parsed, "items.item")
+        try:
+            async for chunk in request.stream():
+                parser.send(chunk)
+                for raw in parsed:
+                    await slots.acquire()
+                    tasks.append(asyncio.create_task(process_item(len(tasks), raw)))
+                del parsed[:]
+            parser.close()
+        except ijson.JSONError as e:
+            results.put_nowait({"success": False, "error": f"Invalid JSON body: {e}"})
+        await asyncio.gather(*tasks)
+        results.put_nowait(None)
+
+    async def lines():
+        dispatcher = asyncio.create_task(dispatch())
+        try:
+            while (result := await results.get()) is not None:
+                yield orjson.dumps(result) + b"\n"
+        finally:
+            dispatcher.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.post('/clear')
+async def clear_history(body: ClearIn):
     """
     Clear conversation history for a sender.
 
@@ -99,41 +437,50 @@ def clear_history():
             "sender": "+1234567890"
         }
     """
-    try:
-        data = request.json
-        sender = data.get('sender')
-
-        if not sender:
-            return jsonify({"success": False, "error": "'sender' is required"}), 400
-
-        if sender in agents:
-            agents[sender].clear_history()
-            return jsonify({"success": True, "message": "History cleared"})
+    if not body.sender:
+        return ORJSONResponse(status_code=400, content={"success": False, "error": "'sender' is required"})
+
+    # Holding flush_lock keeps an in-progress flush from re-writing the session
+    async with get_sender_lock(body.sender), flush_lock:
+        pending = pending_saves.pop(body.sender, None)
+        if await run_in_threadpool(store.clear, body.sender) or pending is not None:
+            return {"success": True, "message": "History cleared"}
         else:
-            return jsonify({"success": True, "message": "No history found"})
-
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
+            return {"success": True, "message": "No history found"}
 
 
-@app.route('/health', methods=['GET'])
-def health():
+@app.get('/health')
+async def health():
     """Health check endpoint."""
-    return jsonify({
+    return {
         "status": "healthy",
-        "active_conversations": len(agents)
-    })
+        # Senders with a request in flight
+        "in_flight_senders": len(sender_locks)
+    }
 
 
 if __name__ == '__main__':
+    import uvicorn
+
+    logging.basicConfig(level=logging.INFO)
+
     print("=" * 70)
     print("Flub Agent API Server")
     print("=" * 70)
     print("Starting server on http://localhost:3000")
     print("Endpoints:")
     print("  POST /query - Process a query")
+    print("  POST /query_stream - Process a query, streaming the response (SSE)")
+    print("  POST /query_batch - Process many queries at once (NDJSON results)")
     print("  POST /clear - Clear conversation history")
     print("  GET  /health - Health check")
     print()
 
-    app.run(host='0.0.0.0', port=3000, debug=False)
+    uvicorn.run(
+        app,
+        host='0.0.0.0',
+        port=3000,
+        loop='uvloop',
+        http='httptools',
+        timeout_keep_alive=5
+    )
@@ -5,6 +5,8 @@ This demonstrates how the agent can now use both flight search and X API tools.
 """
 
 import sys
+import asyncio
+import logging
 from pathlib import Path
 
 # Add parent directory to path
@@ -13,7 +15,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
 from simple_agent import SimpleFlubAgent
 
 
-def demo_x_api_integration():
+async def demo_x_api_integration():
     """Demo the X API integration with simple agent"""
     print("=" * 80)
     print("SimpleFlubAgent with X API Integration Demo")
@@ -52,7 +54,7 @@ def demo_x_api_integration():
     print("\nAgent is processing (this may take a moment)...\n")
     
     try:
-        response = agent.process(query)
+        response = await agent.process(query)
         print("-" * 80)
         print("Agent Response:")
         print("-" * 80)
@@ -65,7 +67,7 @@ def demo_x_api_integration():
         traceback.print_exc()
 
 
-def interactive_mode():
+async def interactive_mode():
     """Run in interactive mode"""
     print("=" * 80)
     print("SimpleFlubAgent - Interactive Mode")
@@ -94,9 +96,11 @@ def interactive_mode():
                 print("\n✓ Conversation history cleared")
                 continue
             
+            # Stream the reply so it starts printing as soon as Claude starts writing
             print("\nAgent: ", end="", flush=True)
-            response = agent.process(user_input)
-            print(response)
+            async for chunk in agent.stream(user_input):
+                print(chunk, end="", flush=True)
+            print()
             
         except KeyboardInterrupt:
             print("\n\nGoodbye! 👋")
@@ -107,10 +111,11 @@ def interactive_mode():
 
 def main():
     """Main entry point"""
+    logging.basicConfig(level=logging.INFO)
     if len(sys.argv) > 1 and sys.argv[1] == "interactive":
-        interactive_mode()
+        asyncio.run(interactive_mode())
     else:
-        demo_x_api_integration()
+        asyncio.run(demo_x_api_integration())
 
 
 if __name__ == "__main__":
@@ -7,6 +7,7 @@ that was converted from X-mcp.
 
 import sys
 import os
+import asyncio
 from pathlib import Path
 
 # Add src directory to path
@@ -20,17 +21,19 @@ from tools import (
 )
 
 
-def example_search_user_tweets():
+async def example_search_user_tweets():
     """Example: Search tweets from a specific user"""
+    username = "elonmusk"  # Example username
+
+    # Fetch first, then print, so concurrent examples don't interleave output
+    result = await asyncio.to_thread(search_user_tweets, username=username, max_results=5)
+
     print("=" * 80)
     print("Example 1: Search User Tweets")
     print("=" * 80)
     
-    username = "elonmusk"  # Example username
     print(f"\nSearching tweets from @{username}...\n")
     
-    result = search_user_tweets(username=username, max_results=5)
-    
     if result.get("success"):
         print(f"User: {result['user']['name']} (@{result['user']['username']})")
         print(f"Followers: {result['user']['followers']:,}")
@@ -48,17 +51,18 @@ def example_search_user_tweets():
     print("\n")
 
 
-def example_search_topics():
+async def example_search_topics():
     """Example: Search for specific topics"""
+    query = "artificial intelligence"  # Example query
+
+    result = await asyncio.to_thread(search_topics, query=query, max_results=5, sort_order="recency")
+
     print("=" * 80)
     print("Example 2: Search Topics")
     print("=" * 80)
     
-    query = "artificial intelligence"  # Example query
     print(f"\nSearching for: '{query}'...\n")
     
-    result = search_topics(query=query, max_results=5, sort_order="recency")
-    
     if result.get("success"):
         print(f"Found {result['count']} tweets about '{query}':")
         print("-" * 80)
@@ -74,16 +78,16 @@ def example_search_topics():
     print("\n")
 
 
-def example_trending_topics():
+async def example_trending_topics():
     """Example: Get trending topics"""
+    result = await asyncio.to_thread(search_trending_topics, woeid=1)  # 1 = Worldwide
+
     print("=" * 80)
     print("Example 3: Trending Topics")
     print("=" * 80)
     
     print("\nFetching worldwide trending topics...\n")
     
-    result = search_trending_topics(woeid=1)  # 1 = Worldwide
-    
     if result.get("success"):
         print(f"Trending in: {result['location']}")
         print(f"As of: {result['as_of']}")
@@ -99,18 +103,19 @@ def example_trending_topics():
     print("\n")
 
 
-def example_analyze_sentiment():
+async def example_analyze_sentiment():
     """Example: Analyze tweet sentiment and engagement"""
+    query = "climate change"  # Example query
+
+    # First, search for tweets
+    tweets_result = await asyncio.to_thread(search_topics, query=query, max_results=20)
+
     print("=" * 80)
     print("Example 4: Analyze Tweet Sentiment")
     print("=" * 80)
     
-    query = "climate change"  # Example query
     print(f"\nAnalyzing tweets about: '{query}'...\n")
     
-    # First, search for tweets
-    tweets_result = search_topics(query=query, max_results=20)
-    
     if tweets_result.get("success"):
         # Then analyze them
         analysis = analyze_tweet_sentiment(tweets_result)
@@ -146,6 +151,17 @@ def example_analyze_sentiment():
     print("\n")
 
 
+async def run_all(examples):
+    """Run all examples concurrently; each one's network calls overlap with the others."""
+    results = await asyncio.gather(
+        *(func() for _, func in examples),
+        return_exceptions=True
+    )
+    for (name, _), result in zip(examples, results):
+        if isinstance(result, Exception):
+            print(f"❌ Error in {name}: {result}\n")
+
+
 def main():
     """Run all examples"""
     print("\n" + "🐦" * 40)
@@ -164,13 +180,9 @@ def main():
     if len(sys.argv) > 1:
         choice = sys.argv[1]
         if choice.isdigit() and 1 <= int(choice) <= len(examples):
-            examples[int(choice) - 1][1]()
+            asyncio.run(examples[int(choice) - 1][1]())
         elif choice == "all":
-            for name, func in examples:
-                try:
-                    func()
-                except Exception as e:
-                    print(f"❌ Error in {name}: {e}\n")
+            asyncio.run(run_all(examples))
         else:
             print(f"Invalid choice. Use 1-{len(examples)} or 'all'")
     else:
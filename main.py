@@ -6,16 +6,17 @@ Main entry point for the Flub Agent.
 """
 
 import asyncio
-import sys
-import os
-
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+import logging
+from datetime import datetime, timedelta
 
 from src.simple_agent import SimpleFlubAgent
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Date for the example query, computed once at import
+TOMORROW = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+
 
 async def main():
     """Main entry point."""
@@ -29,22 +30,21 @@ async def main():
     print()
 
     # Example query - with tomorrow's date
-    from datetime import datetime, timedelta
-    tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
-    query = f"What is the best flight from EWR to LAX on {tomorrow}?"
+    query = f"What is the best flight from EWR to LAX on {TOMORROW}?"
 
     print(f"Query: {query}\n")
     print("Processing...\n")
 
-    # Note: SimpleFlubAgent.process() is not async
-    response = agent.process(query)
-
     print("=" * 70)
     print("Response:")
     print("=" * 70)
-    print(response)
-    print()
+
+    # Print the reply as it's generated instead of waiting for all of it
+    async for chunk in agent.stream(query):
+        print(chunk, end="", flush=True)
+    print("\n")
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     asyncio.run(main())
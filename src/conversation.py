@@ -0,0 +1,31 @@
+"""
+Conversation State
+
+Per-session conversation state, kept separate from the agent so callers that
+only load and save sessions don't have to import the Anthropic SDK and tools.
+"""
+
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List
+
+# Messages that depend on the current date or time, so their answers go stale
+TIME_SENSITIVE = re.compile(r"\b(date|time|day|today|tonight|tomorrow|now)\b", re.IGNORECASE)
+
+
+def stamp_message(message: str) -> str:
+    """A user message as kept in history, prefixed with the [date time] it was sent."""
+    return f"[{datetime.now().strftime('%Y-%m-%d %H:%M')}] {message}"
+
+
+@dataclass
+class Conversation:
+    """Per-session state: recent messages plus a summary of older turns."""
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    summary: str = ""
+
+    @property
+    def used_tools(self) -> bool:
+        """Whether any turn called a tool (tool exchanges are block lists, not text)."""
+        return any(not isinstance(m["content"], str) for m in self.messages)
@@ -0,0 +1,147 @@
+"""
+Session Store
+
+Persists per-sender conversation turns in SQLite so history survives server
+restarts.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Tuple
+import orjson
+
+
+class SQLiteSessionStore:
+    """
+    Store of conversation state keyed by session (sender) id.
+
+    Messages are stored exactly as the agent sends them to Claude, tool
+    exchanges included (tool results older than the latest turn are already
+    elided by then), along with the running summary of older turns. Reloading
+    a session therefore gives the same prompt prefix, so the next turn still
+    reads its history from the prompt cache.
+    """
+
+    def __init__(self, path: str = "sessions.db"):
+        """
+        Open (or create) the session database.
+
+        Args:
+            path: Path to the SQLite database file
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT NOT NULL, ts REAL NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL,"
+            " blocks INTEGER NOT NULL DEFAULT 0)"
+        )
+        # Databases from before tool exchanges were stored hold text only
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")]
+        if "blocks" not in columns:
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN blocks INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS sessions_by_id ON sessions (session_id, ts)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "session_id TEXT PRIMARY KEY, summary TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def load(self, session_id: str) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        Load a session's messages (oldest first) and summary.
+
+        Returns:
+            (messages, summary) - empty for an unknown session
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content, blocks FROM sessions WHERE session_id = ? ORDER BY ts, rowid",
+                (session_id,)
+            ).fetchall()
+            summary = self._conn.execute(
+                "SELECT summary FROM summaries WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+
+        messages = [
+            {"role": role, "content": orjson.loads(content) if blocks else content}
+            for role, content, blocks in rows
+        ]
+        return messages, summary[0] if summary else ""
+
+    def save(self, session_id: str, messages: List[Dict[str, Any]], summary: str):
+        """
+        Replace a session's stored state.
+
+        A trailing turn that never got a final reply is dropped, so the
+        stored history starts with a user message and ends with a reply.
+        """
+        self.save_many([(session_id, (messages, summary))])
+
+    def save_many(self, sessions: Iterable[Tuple[str, Tuple[List[Dict[str, Any]], str]]]):
+        """
+        Replace the stored state of several sessions in one transaction.
+
+        Args:
+            sessions: (session_id, (messages, summary)) pairs
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            for session_id, (messages, summary) in sessions:
+                self._replace(session_id, self._complete_turns(messages), summary, now)
+
+    @staticmethod
+    def _complete_turns(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Messages from the first user text up to the last final reply."""
+        start = 0
+        while start < len(messages) and not (
+            messages[start]["role"] == "user" and isinstance(messages[start]["content"], str)
+        ):
+            start += 1
+        end = len(messages)
+        while end > start and not (
+            messages[end - 1]["role"] == "assistant" and isinstance(messages[end - 1]["content"], str)
+        ):
+            end -= 1
+        return messages[start:end]
+
+    def _replace(self, session_id: str, messages: List[Dict[str, Any]], summary: str, now: float):
+        """Overwrite one session's rows; the caller holds the lock and transaction."""
+        self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        self._conn.executemany(
+            "INSERT INTO sessions VALUES (?, ?, ?, ?, ?)",
+            [
+                (session_id, now, m["role"], m["content"], 0) if isinstance(m["content"], str)
+                else (session_id, now, m["role"], orjson.dumps(m["content"]).decode(), 1)
+                for m in messages
+            ]
+        )
+        self._conn.execute(
+            "INSERT OR REPLACE INTO summaries VALUES (?, ?)",
+            (session_id, summary)
+        )
+
+    def clear(self, session_id: str) -> bool:
+        """
+        Delete all state for a session.
+
+        Returns:
+            True if the session had any stored history
+        """
+        with self._lock, self._conn:
+            deleted = self._conn.execute(
+                "DELETE FROM sessions WHERE session_id = ?", (session_id,)
+            ).rowcount
+            self._conn.execute("DELETE FROM summaries WHERE session_id = ?", (session_id,))
+        return deleted > 0
+
+    def close(self):
+        """Close the underlying connection."""
+        with self._lock:
+            self._conn.close()
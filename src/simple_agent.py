@@ -5,14 +5,21 @@ Uses Claude API directly with function calling to access flight search tools.
 """
 
 import os
-import json
-from typing import Dict, Any, Optional
+import re
+import asyncio
+import logging
+from typing import Dict, Any, AsyncIterator, List, Optional
 from datetime import datetime
-from anthropic import Anthropic
+import httpx
+from anthropic import AsyncAnthropic
+from cachetools import TTLCache
 from dotenv import load_dotenv
+import orjson
 
 load_dotenv()
 
+from .conversation import Conversation, stamp_message
+
 # Import our tools (after load_dotenv)
 from .tools import (
     search_flights, 
@@ -24,209 +31,41 @@ from .tools import (
     check_weather
 )
 
+logger = logging.getLogger(__name__)
+
+ANTHROPIC_API_KEY = os.environ.get("ANTHROPIC_API_KEY")
+
+# Number of most recent user turns kept verbatim; older turns are folded into a summary
+RECENT_TURNS = int(os.environ.get("RECENT_TURNS", "12"))
+# Rough token budget for the kept history; large tool results can hit it first
+MAX_HISTORY_TOKENS = int(os.environ.get("MAX_HISTORY_TOKENS", "8000"))
+# Tool calls allowed to run at once across every conversation the agent serves,
+# so bursts don't flood the X API rate limits or the thread pool
+MAX_TOOL_CONCURRENCY = int(os.environ.get("MAX_TOOL_CONCURRENCY", "8"))
+# Claude calls allowed in flight at once across every conversation, so a burst
+# of messages queues here instead of tripping rate limits and retrying
+MAX_MODEL_CONCURRENCY = int(os.environ.get("MAX_MODEL_CONCURRENCY", "16"))
+
+# Seconds to reuse results of tools that don't cache themselves (the flight
+# and X API tools do), so a repeated question doesn't call the API again
+TOOL_CACHE_TTL = {"check_weather": 900}
+_tool_caches = {name: TTLCache(maxsize=1024, ttl=ttl) for name, ttl in TOOL_CACHE_TTL.items()}
+MODEL = "claude-sonnet-4-5-20250929"
+# Faster model for greetings and other small talk that needs no reasoning
+FAST_MODEL = "claude-haiku-4-5"
+SUMMARY_MODEL = "claude-haiku-4-5"
+
+SMALL_TALK = re.compile(
+    r"(hi|hey|hello|yo|sup|thanks|thank you|thx|ok|okay|cool|bye"
+    r"|good (morning|afternoon|evening|night)"
+    r"|what'?s the (date|time)( today)?|what (day|time) is it)\W*",
+    re.IGNORECASE
+)
 
-class SimpleFlubAgent:
-    """
-    Simple Claude agent that uses direct function calling instead of MCP.
-    """
-
-    def __init__(self, api_key: Optional[str] = None):
-        """
-        Initialize the Simple Flub Agent.
-
-        Args:
-            api_key: Anthropic API key (or set ANTHROPIC_API_KEY env var)
-        """
-        self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
-        if not self.api_key:
-            raise ValueError("API key not found. Set ANTHROPIC_API_KEY in .env")
-
-        self.client = Anthropic(api_key=self.api_key)
-        self.conversation_history = []
-
-        # Define tools for Claude
-        self.tools = [
-            {
-                "name": "search_flights",
-                "description": "Search for flights between two airports on a specific date. Returns a list of available flights with pricing, duration, and other details.",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "date": {
-                            "type": "string",
-                            "description": "Flight date in YYYY-MM-DD format (e.g., '2025-11-10')"
-                        },
-                        "from_airport": {
-                            "type": "string",
-                            "description": "Departure airport code (e.g., 'EWR', 'JFK', 'LAX')"
-                        },
-                        "to_airport": {
-                            "type": "string",
-                            "description": "Arrival airport code (e.g., 'LAX', 'SFO', 'LHR')"
-                        },
-                        "adults": {
-                            "type": "integer",
-                            "description": "Number of adult passengers",
-                            "default": 1
-                        },
-                        "max_results": {
-                            "type": "integer",
-                            "description": "Maximum number of flights to return",
-                            "default": 10
-                        }
-                    },
-                    "required": ["date", "from_airport", "to_airport"]
-                }
-            },
-            {
-                "name": "check_weather",
-                "description": "Get current weather information for a specific city. Returns temperature, conditions, and other weather data.",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "city": {
-                            "type": "string",
-                            "description": "The name of the city to check weather for (e.g., 'London', 'New York', 'Tokyo')"
-                        }
-                    },
-                    "required": ["city"]
-                }
-            },
-            {
-                "name": "find_best_price",
-                "description": "Find the cheapest flight option for a specific route and date. Returns the single cheapest flight with price comparisons.",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "date": {
-                            "type": "string",
-                            "description": "Flight date in YYYY-MM-DD format"
-                        },
-                        "from_airport": {
-                            "type": "string",
-                            "description": "Departure airport code"
-                        },
-                        "to_airport": {
-                            "type": "string",
-                            "description": "Arrival airport code"
-                        },
-                        "adults": {
-                            "type": "integer",
-                            "description": "Number of adult passengers",
-                            "default": 1
-                        }
-                    },
-                    "required": ["date", "from_airport", "to_airport"]
-                }
-            },
-            {
-                "name": "search_user_tweets",
-                "description": "Search through the most recent tweets of a specific X/Twitter user. Returns user info and their recent tweets with engagement metrics.",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "username": {
-                            "type": "string",
-                            "description": "The X/Twitter username without @ symbol (e.g., 'elonmusk', 'united', 'delta')"
-                        },
-                        "max_results": {
-                            "type": "integer",
-                            "description": "Maximum number of tweets to return (default: 10, max: 100)",
-                            "default": 10
-                        }
-                    },
-                    "required": ["username"]
-                }
-            },
-            {
-                "name": "search_topics",
-                "description": "Search for tweets about specific topics or keywords on X/Twitter. Returns tweets matching the query with author info and engagement metrics. Useful for monitoring travel disruptions, delays, incidents.",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "query": {
-                            "type": "string",
-                            "description": "The search query or topic to search for (e.g., 'flight delays LAX', 'airport security JFK', 'United Airlines delays')"
-                        },
-                        "max_results": {
-                            "type": "integer",
-                            "description": "Maximum number of tweets to return (default: 10, max: 100)",
-                            "default": 10
-                        },
-                        "sort_order": {
-                            "type": "string",
-                            "description": "Sort order: 'recency' for newest first or 'relevancy' for most relevant",
-                            "enum": ["recency", "relevancy"],
-                            "default": "recency"
-                        }
-                    },
-                    "required": ["query"]
-                }
-            },
-            {
-                "name": "analyze_tweet_sentiment",
-                "description": "Analyze engagement metrics and sentiment from tweet search results. Takes the output from search_topics or search_user_tweets and provides aggregated statistics.",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "tweets_data": {
-                            "type": "object",
-                            "description": "The complete output from search_topics or search_user_tweets functions"
-                        }
-                    },
-                    "required": ["tweets_data"]
-                }
-            }
-        ]
-
-    def _call_tool(self, tool_name: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
-        """Call the appropriate tool function."""
-        if tool_name == "search_flights":
-            return search_flights(**tool_input)
-        elif tool_name == "find_best_price":
-            return find_best_price(**tool_input)
-        elif tool_name == "search_user_tweets":
-            return search_user_tweets(**tool_input)
-        elif tool_name == "search_topics":
-            return search_topics(**tool_input)
-        elif tool_name == "search_trending_topics":
-            return search_trending_topics(**tool_input)
-        elif tool_name == "analyze_tweet_sentiment":
-            return analyze_tweet_sentiment(**tool_input)
-        elif tool_name == "check_weather":
-            return check_weather(**tool_input)
-        else:
-            return {"error": f"Unknown tool: {tool_name}"}
-
-    def process(self, message: str) -> str:
-        """
-        Process a user message and return a response.
-
-        Args:
-            message: The user's message/query
-
-        Returns:
-            The agent's response string
-        """
-        # Add user message to history
-        self.conversation_history.append({
-            "role": "user",
-            "content": message
-        })
-
-        # Get current datetime for context
-        current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        current_date = datetime.now().strftime("%Y-%m-%d")
-
-        try:
-            # Call Claude with tools
-            response = self.client.messages.create(
-                model="claude-sonnet-4-5-20250929",
-                max_tokens=1024,
-                system=f"""You are Flub, a helpful flight search assistant. You communicate via iMessage text messages.
 
-TODAY'S DATE: {current_date}
-CURRENT TIME: {current_datetime}
+# Static instructions, kept free of per-request values so the tools + system
+# prefix is byte-identical on every call and served from the prompt cache
+SYSTEM_PROMPT = """You are Flub, a helpful flight search assistant. You communicate via iMessage text messages.
 
 CRITICAL RULES - FOLLOW EXACTLY:
 
@@ -245,10 +84,11 @@ CRITICAL RULES - FOLLOW EXACTLY:
    RIGHT (X tool): "Checked X - no delays reported at LAX right now"
 
 2. DATE VALIDATION (MUST CHECK BEFORE SEARCHING):
-   - Today is {current_date}
-   - ONLY search for flights on dates >= {current_date}
+   - Today's date is given under TODAY'S DATE at the end of these instructions
+   - Each user message starts with the [date time] it was sent; use the latest one as the current time
+   - ONLY search for flights on dates >= today's date
    - If user asks for past dates, respond: "I can only search for upcoming flights. That date has passed."
-   - Calculate relative dates: "tomorrow" = day after {current_date}, "next Friday" = calculate from {current_date}
+   - Calculate relative dates: "tomorrow" = day after today's date, "next Friday" = calculate from today's date
    - NEVER call search tools for past dates
 
  3. WHAT YOU CAN DO:
@@ -259,6 +99,7 @@ CRITICAL RULES - FOLLOW EXACTLY:
     - Monitor airline accounts for updates
     - Search trending travel topics
     - Analyze social media sentiment about travel issues
+    - Run several searches at once: when a question covers more than one route or date, call the tools for all of them together in one step
  
  4. WHAT YOU CANNOT DO:
    - Book flights (you only search)
@@ -298,73 +139,715 @@ United 890 at 3pm - $275 (1 stop, 7h 45m)
     - Don't overuse X tools - only when user asks about disruptions or you think it's relevant
     - REMINDER: Even when presenting X/Twitter results, NO MARKDOWN, NO BULLETS, NO TRAVEL EMOJIS!
 
- Remember: Plain text only. No markdown. Only weather/emotion emojis (☀️🌧️😊) allowed. Check dates before searching.""",
-                messages=self.conversation_history,
-                tools=self.tools
-            )
-
-            # Process the response
-            while response.stop_reason == "tool_use":
-                # Extract tool uses
-                tool_results = []
-
-                for block in response.content:
-                    if block.type == "tool_use":
-                        tool_name = block.name
-                        tool_input = block.input
-                        tool_use_id = block.id
-
-                        print(f"[Tool Call] {tool_name} with {tool_input}")
-
-                        # Call the tool
-                        result = self._call_tool(tool_name, tool_input)
-
-                        tool_results.append({
-                            "type": "tool_result",
-                            "tool_use_id": tool_use_id,
-                            "content": json.dumps(result)
-                        })
-
-                # Add assistant response to history
-                self.conversation_history.append({
-                    "role": "assistant",
-                    "content": response.content
-                })
-
-                # Add tool results to history
-                self.conversation_history.append({
-                    "role": "user",
-                    "content": tool_results
-                })
-
-                # Continue the conversation with tool results
-                response = self.client.messages.create(
-                    model="claude-sonnet-4-5-20250929",
-                    max_tokens=4096,
-                    messages=self.conversation_history,
-                    tools=self.tools
+ Remember: Plain text only. No markdown. Only weather/emotion emojis (☀️🌧️😊) allowed. Check dates before searching."""
+
+# The instructions as a system block, with a cache breakpoint that covers the
+# tool schemas before it too. Kept for an hour rather than the default five
+# minutes, since iMessage conversations often pause longer than that.
+SYSTEM_BLOCK = {
+    "type": "text",
+    "text": SYSTEM_PROMPT,
+    "cache_control": {"type": "ephemeral", "ttl": "1h"}
+}
+
+
+# Tool schemas for Claude, built once and shared by every agent
+TOOLS = [
+    {
+        "name": "search_flights",
+        "description": "Search for flights between two airports on a specific date. Returns a list of available flights with pricing, duration, and other details.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "date": {
+                    "type": "string",
+                    "description": "Flight date in YYYY-MM-DD format (e.g., '2025-11-10')"
+                },
+                "from_airport": {
+                    "type": "string",
+                    "description": "Departure airport code (e.g., 'EWR', 'JFK', 'LAX')"
+                },
+                "to_airport": {
+                    "type": "string",
+                    "description": "Arrival airport code (e.g., 'LAX', 'SFO', 'LHR')"
+                },
+                "adults": {
+                    "type": "integer",
+                    "description": "Number of adult passengers",
+                    "default": 1
+                },
+                "max_results": {
+                    "type": "integer",
+                    "description": "Maximum number of flights to return",
+                    "default": 10
+                }
+            },
+            "required": ["date", "from_airport", "to_airport"]
+        }
+    },
+    {
+        "name": "check_weather",
+        "description": "Get current weather information for a specific city. Returns temperature, conditions, and other weather data.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "city": {
+                    "type": "string",
+                    "description": "The name of the city to check weather for (e.g., 'London', 'New York', 'Tokyo')"
+                }
+            },
+            "required": ["city"]
+        }
+    },
+    {
+        "name": "find_best_price",
+        "description": "Find the cheapest flight option for a specific route and date. Returns the single cheapest flight with price comparisons.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "date": {
+                    "type": "string",
+                    "description": "Flight date in YYYY-MM-DD format"
+                },
+                "from_airport": {
+                    "type": "string",
+                    "description": "Departure airport code"
+                },
+                "to_airport": {
+                    "type": "string",
+                    "description": "Arrival airport code"
+                },
+                "adults": {
+                    "type": "integer",
+                    "description": "Number of adult passengers",
+                    "default": 1
+                }
+            },
+            "required": ["date", "from_airport", "to_airport"]
+        }
+    },
+    {
+        "name": "search_user_tweets",
+        "description": "Search through the most recent tweets of a specific X/Twitter user. Returns user info and their recent tweets with engagement metrics.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "username": {
+                    "type": "string",
+                    "description": "The X/Twitter username without @ symbol (e.g., 'elonmusk', 'united', 'delta')"
+                },
+                "max_results": {
+                    "type": "integer",
+                    "description": "Maximum number of tweets to return (default: 10, max: 100)",
+                    "default": 10
+                }
+            },
+            "required": ["username"]
+        }
+    },
+    {
+        "name": "search_trending_topics",
+        "description": "Get the current trending topics on X/Twitter for a location. Useful for spotting major travel disruptions or events people are talking about.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "woeid": {
+                    "type": "integer",
+                    "description": "Where On Earth ID of the location (1 = Worldwide, 23424977 = USA, 2459115 = New York)",
+                    "default": 1
+                }
+            }
+        }
+    },
+    {
+        "name": "search_topics",
+        "description": "Search for tweets about specific topics or keywords on X/Twitter. Returns tweets matching the query with author info and engagement metrics. Useful for monitoring travel disruptions, delays, incidents.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "The search query or topic to search for (e.g., 'flight delays LAX', 'airport security JFK', 'United Airlines delays')"
+                },
+                "max_results": {
+                    "type": "integer",
+                    "description": "Maximum number of tweets to return (default: 10, max: 100)",
+                    "default": 10
+                },
+                "sort_order": {
+                    "type": "string",
+                    "description": "Sort order: 'recency' for newest first or 'relevancy' for most relevant",
+                    "enum": ["recency", "relevancy"],
+                    "default": "recency"
+                }
+            },
+            "required": ["query"]
+        }
+    },
+    {
+        "name": "analyze_tweet_sentiment",
+        "description": "Analyze engagement metrics and sentiment from tweet search results. Takes the output from search_topics or search_user_tweets and provides aggregated statistics.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "tweets_data": {
+                    "type": "object",
+                    "description": "The complete output from search_topics or search_user_tweets functions"
+                }
+            },
+            "required": ["tweets_data"]
+        }
+    }
+]
+
+
+# Tool implementations by name
+TOOL_FUNCTIONS = {
+    "search_flights": search_flights,
+    "find_best_price": find_best_price,
+    "search_user_tweets": search_user_tweets,
+    "search_trending_topics": search_trending_topics,
+    "search_topics": search_topics,
+    "analyze_tweet_sentiment": analyze_tweet_sentiment,
+    "check_weather": check_weather,
+}
+
+
+class SimpleFlubAgent:
+    """
+    Simple Claude agent that uses direct function calling instead of MCP.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        history: Optional[List[Dict[str, Any]]] = None,
+        http_client: Optional[httpx.AsyncClient] = None
+    ):
+        """
+        Initialize the Simple Flub Agent.
+
+        Args:
+            api_key: Anthropic API key (or set ANTHROPIC_API_KEY env var)
+            history: Prior messages to resume a conversation from
+            http_client: Shared httpx client so many agents reuse one connection pool
+        """
+        # Conversation used by process()/stream() when none is passed in
+        self.conversation = Conversation(messages=list(history or []))
+
+        self.api_key = api_key or ANTHROPIC_API_KEY
+        if not self.api_key:
+            raise ValueError("API key not found. Set ANTHROPIC_API_KEY in .env")
+
+        self.client = AsyncAnthropic(api_key=self.api_key, http_client=http_client)
+        self.tools = TOOLS
+        self.tool_slots = asyncio.Semaphore(MAX_TOOL_CONCURRENCY)
+        self.model_slots = asyncio.Semaphore(MAX_MODEL_CONCURRENCY)
+
+    def _call_tool(self, tool_name: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
+        """Call the appropriate tool function."""
+        tool = TOOL_FUNCTIONS.get(tool_name)
+        if tool is None:
+            return {"error": f"Unknown tool: {tool_name}"}
+
+        try:
+            return tool(**tool_input)
+        except Exception as e:
+            # Report the failure to Claude rather than failing the whole turn
+            logger.exception("Tool %s failed", tool_name)
+            return {"error": f"{tool_name} failed: {str(e)}"}
+
+    @property
+    def conversation_history(self) -> List[Dict[str, Any]]:
+        """Messages of the agent's own conversation."""
+        return self.conversation.messages
+
+    @property
+    def summary(self) -> str:
+        """Summary of older turns in the agent's own conversation."""
+        return self.conversation.summary
+
+    @staticmethod
+    def _turn_starts(conversation: Conversation) -> list:
+        """Indexes of messages that open a turn (user text, not tool results)."""
+        return [
+            i for i, m in enumerate(conversation.messages)
+            if m["role"] == "user" and isinstance(m["content"], str)
+        ]
+
+    @staticmethod
+    def _render_transcript(messages: list) -> str:
+        """Render the text parts of messages as a plain transcript for summarizing."""
+        lines = []
+        for m in messages:
+            if isinstance(m["content"], str):
+                lines.append(f"{m['role'].capitalize()}: {m['content']}")
+            else:
+                for block in m["content"]:
+                    if block["type"] == "tool_use":
+                        lines.append(f"Assistant called {block['name']} with {block['input']}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _estimate_tokens(messages: list) -> int:
+        """Rough token count of messages (about 4 characters per token)."""
+        chars = 0
+        for m in messages:
+            if isinstance(m["content"], str):
+                chars += len(m["content"])
+                continue
+            for block in m["content"]:
+                chars += len(str(block.get("text") or block.get("input") or block.get("content", "")))
+        return chars // 4
+
+    def _history_cut(self, conversation: Conversation) -> int:
+        """Index before which messages should be folded into the summary (0 for none)."""
+        starts = self._turn_starts(conversation)
+        if len(starts) >= RECENT_TURNS:
+            return starts[len(starts) - RECENT_TURNS // 2]
+
+        # Over the token budget: fold the oldest turns until the rest fits,
+        # always keeping the most recent turn
+        tokens = self._estimate_tokens(conversation.messages)
+        cut = 0
+        for start in starts[1:]:
+            if tokens <= MAX_HISTORY_TOKENS:
+                break
+            tokens -= self._estimate_tokens(conversation.messages[cut:start])
+            cut = start
+        return cut
+
+    def _elide_old_tool_results(self, conversation: Conversation):
+        """
+        Replace tool results before the latest turn with a short placeholder.
+
+        Old flight lists and tweet dumps rarely matter once later turns have
+        moved on, and the summary keeps what was decided from them.
+        """
+        starts = self._turn_starts(conversation)
+        if len(starts) < 2:
+            return
+
+        tool_names = {}
+        for i in range(starts[-1]):
+            m = conversation.messages[i]
+            if isinstance(m["content"], str):
+                continue
+            if m["role"] == "assistant":
+                for block in m["content"]:
+                    if block["type"] == "tool_use":
+                        tool_names[block["id"]] = block["name"]
+            else:
+                conversation.messages[i] = {"role": "user", "content": [
+                    {**b, "content": f"[prior {tool_names.get(b['tool_use_id'], 'tool')} result omitted]"}
+                    for b in m["content"]
+                ]}
+
+    async def _compact_history(self, conversation: Conversation):
+        """
+        Keep the last RECENT_TURNS turns and fold the rest into the summary.
+
+        When the window is full, the oldest half is summarized in one cheap call so
+        the summarizer runs every RECENT_TURNS // 2 turns rather than every turn.
+        Turns are also folded early when the history outgrows MAX_HISTORY_TOKENS.
+        Tool results older than the latest turn are elided first, so one huge
+        old result doesn't push the history over budget and trigger a summary.
+        """
+        self._elide_old_tool_results(conversation)
+        cut = self._history_cut(conversation)
+        if not cut:
+            return
+
+        folded = conversation.messages[:cut]
+        del conversation.messages[:cut]
+
+        prior = f"Summary so far: {conversation.summary}\n\n" if conversation.summary else ""
+        try:
+            async with self.model_slots:
+                response = await self.client.messages.create(
+                    model=SUMMARY_MODEL,
+                    max_tokens=300,
+                    system="Summarize this travel-assistant conversation in one short paragraph. "
+                           "Keep facts the assistant will need later: routes, dates, passengers, "
+                           "preferences, and anything already found or decided.",
+                    messages=[{
+                        "role": "user",
+                        "content": prior + self._render_transcript(folded)
+                    }]
                 )
+            conversation.summary = "".join(b.text for b in response.content if b.type == "text")
+        except Exception as e:
+            # Still drop the old turns; losing detail beats unbounded prompts
+            logger.warning("Summary failed: %s", e)
+
+    def _system_prompt(self, conversation: Conversation) -> List[Dict[str, Any]]:
+        """
+        Build the system prompt: the cached static instructions, then today's
+        date and the summary. Both only change between turns occasionally, so
+        the conversation history after them stays cacheable too.
+        """
+        context = f"TODAY'S DATE: {datetime.now().strftime('%Y-%m-%d')}"
+        if conversation.summary:
+            context += f"\n\nPrior context: {conversation.summary}"
+        return [
+            SYSTEM_BLOCK,
+            {"type": "text", "text": context}
+        ]
 
-            # Extract final text response
-            final_text = ""
-            for block in response.content:
-                if hasattr(block, 'text'):
-                    final_text += block.text
+    async def _begin_turn(self, message: str, conversation: Conversation):
+        """Start a new turn with the user's message."""
+        # Fold old turns into the summary before adding the new one
+        await self._compact_history(conversation)
 
-            # Add final response to history
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": final_text
-            })
+        # Add user message to history, stamped with the time it was sent.
+        # The stamp stays with the message, so earlier turns never change.
+        conversation.messages.append({
+            "role": "user",
+            "content": stamp_message(message)
+        })
+
+    @staticmethod
+    def _first_call(message: str) -> Dict[str, Any]:
+        """
+        Model and output budget for a turn's first call. Small talk goes to the
+        fast model; if it decides it needs a tool after all, the follow-up
+        calls use the main model.
+        """
+        if len(message) < 40 and SMALL_TALK.fullmatch(message.strip()):
+            return {"model": FAST_MODEL, "max_tokens": 200}
+        return {"model": MODEL, "max_tokens": 1024}
+
+    @staticmethod
+    def _with_cache_breakpoint(messages: list) -> list:
+        """
+        Copy of messages with a cache breakpoint on the last one, so the whole
+        history is cached and the next call only pays for what's new.
+        """
+        last = messages[-1]
+        if isinstance(last["content"], str):
+            blocks = [{"type": "text", "text": last["content"]}]
+        else:
+            blocks = list(last["content"])
+        blocks[-1] = {**blocks[-1], "cache_control": {"type": "ephemeral"}}
+        return messages[:-1] + [{"role": last["role"], "content": blocks}]
+
+    async def _run_tool(self, tool_name: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
+        """Run one tool in a worker thread once a tool slot is free, reusing recent results."""
+        cache = _tool_caches.get(tool_name)
+        key = orjson.dumps(tool_input, option=orjson.OPT_SORT_KEYS)
+        if cache is not None and key in cache:
+            return cache[key]
+
+        async with self.tool_slots:
+            result = await asyncio.to_thread(self._call_tool, tool_name, tool_input)
+
+        # Failures are not cached
+        if cache is not None and "error" not in result and result.get("success", True):
+            cache[key] = result
+        return result
+
+    def _start_tool(self, block, running: Dict[bytes, "asyncio.Task"]) -> "asyncio.Task":
+        """
+        Start running a tool_use block. Claude sometimes repeats a call within
+        one response; an identical call already in `running` shares its task.
+        """
+        key = block.name.encode() + orjson.dumps(block.input, option=orjson.OPT_SORT_KEYS)
+        if key not in running:
+            running[key] = asyncio.create_task(self._run_tool(block.name, block.input))
+        return running[key]
+
+    @staticmethod
+    def _compact_tool_result(tool_name: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Drop fields Claude doesn't need from a tool result before it goes into
+        history: the echoed query (Claude wrote it), flight ranks (implied by
+        order) and empty or false per-flight flags.
+        """
+        if tool_name not in ("search_flights", "find_best_price") or not result.get("success"):
+            return result
+
+        compact = {k: v for k, v in result.items() if k != "query"}
+        if "flights" in compact:
+            compact["flights"] = [
+                {
+                    k: v for k, v in flight.items()
+                    if k != "rank" and not (k.endswith("_ahead") and not v) and not (k == "is_best" and not v)
+                }
+                for flight in compact["flights"]
+            ]
+        return compact
+
+    async def _run_tools(
+        self,
+        response,
+        conversation: Conversation,
+        started: Optional[Dict[str, "asyncio.Task"]] = None
+    ):
+        """
+        Run every tool_use block in a response and record the exchange in history.
+
+        Args:
+            response: Claude's response asking for tools
+            conversation: Conversation to record the exchange in
+            started: Tasks already running for some blocks, by tool_use id
+        """
+        started = started or {}
+
+        # Extract tool uses
+        tool_uses = [block for block in response.content if block.type == "tool_use"]
+
+        for block in tool_uses:
+            logger.info("Tool call %s with %s", block.name, block.input)
+
+        # Claude may ask for several tools at once (e.g. flights and weather);
+        # run them concurrently, off the event loop since the tools block
+        running = {}
+        results = await asyncio.gather(*(
+            started.get(block.id) or self._start_tool(block, running)
+            for block in tool_uses
+        ))
+
+        tool_results = [
+            {
+                "type": "tool_result",
+                "tool_use_id": block.id,
+                "content": orjson.dumps(self._compact_tool_result(block.name, result)).decode()
+            }
+            for block, result in zip(tool_uses, results)
+        ]
+
+        # Add assistant response to history, as plain dicts so the history
+        # can be stored and reloaded exactly as Claude saw it
+        conversation.messages.append({
+            "role": "assistant",
+            "content": [block.model_dump(exclude_none=True) for block in response.content]
+        })
+
+        # Add tool results to history
+        conversation.messages.append({
+            "role": "user",
+            "content": tool_results
+        })
+
+    def _finish_turn(self, final_text: str, conversation: Conversation):
+        """Record the final reply."""
+        # Add final response to history
+        conversation.messages.append({
+            "role": "assistant",
+            "content": final_text
+        })
+
+    async def _stream_turn(self, conversation: Conversation, request: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        Call Claude and run tool rounds until its final reply, then record it.
+
+        Yields text as Claude generates it, with a blank line after text
+        written before a tool call. Each tool starts as soon as its input has
+        streamed in, while Claude may still be writing other tool calls.
+
+        Args:
+            conversation: Conversation to continue; it ends with the user's turn
+            request: Model, max_tokens and system prompt for the first call
+        """
+        while True:
+            started = {}
+            running = {}
+            # Claude writes into a queue while holding a model slot, so the
+            # slot frees up when generation ends, not when a slow client
+            # has finished reading the text
+            chunks = asyncio.Queue()
+
+            async def call_claude():
+                try:
+                    async with self.model_slots:
+                        async with self.client.messages.stream(
+                            messages=self._with_cache_breakpoint(conversation.messages),
+                            tools=self.tools,
+                            **request
+                        ) as stream:
+                            async for event in stream:
+                                if event.type == "text":
+                                    chunks.put_nowait(event.text)
+                                elif event.type == "content_block_stop" and event.content_block.type == "tool_use":
+                                    block = event.content_block
+                                    started[block.id] = self._start_tool(block, running)
+                            return await stream.get_final_message()
+                finally:
+                    chunks.put_nowait(None)
+
+            call = asyncio.create_task(call_claude())
+            streamed = False
+            try:
+                while (text := await chunks.get()) is not None:
+                    streamed = True
+                    yield text
+                response = await call
+            finally:
+                # Only has an effect if the consumer stopped reading early
+                call.cancel()
+
+            if response.stop_reason != "tool_use":
+                break
+
+            if streamed:
+                yield "\n\n"
+            await self._run_tools(response, conversation, started)
+
+            # Continue the conversation with tool results; the same system
+            # prompt keeps the cached prefix from the previous call usable
+            request = {**request, "model": MODEL, "max_tokens": 1024}
+
+        final_text = "".join(b.text for b in response.content if b.type == "text")
+        self._finish_turn(final_text, conversation)
+
+    async def respond(self, message: str, conversation: Conversation) -> str:
+        """
+        Answer a user message within the given conversation.
+
+        The agent keeps no per-session state here, so one instance can serve
+        every session; the conversation is updated in place.
+
+        Args:
+            message: The user's message/query
+            conversation: The session's conversation state
+
+        Returns:
+            The agent's response string
 
+        Raises:
+            Exception: Any error from the Claude API
+        """
+        await self._begin_turn(message, conversation)
+        request = {
+            **self._first_call(message),
+            "system": self._system_prompt(conversation)
+        }
+
+        # Streamed even though the text is only returned at the end, so
+        # tools can start before Claude has finished the whole response
+        async for _ in self._stream_turn(conversation, request):
+            pass
+
+        return conversation.messages[-1]["content"]
+
+    async def _complete_turn(self, response, conversation: Conversation, system: list) -> str:
+        """Finish a turn from Claude's first response, running any tool rounds it asks for."""
+        if response.stop_reason != "tool_use":
+            final_text = "".join(b.text for b in response.content if b.type == "text")
+            self._finish_turn(final_text, conversation)
             return final_text
 
+        await self._run_tools(response, conversation)
+        request = {"model": MODEL, "max_tokens": 1024, "system": system}
+        async for _ in self._stream_turn(conversation, request):
+            pass
+
+        return conversation.messages[-1]["content"]
+
+    async def process(self, message: str) -> str:
+        """
+        Process a user message and return a response.
+
+        Args:
+            message: The user's message/query
+
+        Returns:
+            The agent's response string
+        """
+        try:
+            return await self.respond(message, self.conversation)
+
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error processing request")
             error_msg = f"Error processing request: {str(e)}"
             return error_msg
 
+    async def process_batch(self, messages: List[str], poll_interval: float = 30.0) -> List[str]:
+        """
+        Answer independent one-shot messages through the Message Batches API.
+
+        Batches cost half as much as regular calls but can take minutes to
+        hours, so this is for non-interactive jobs (e.g. checking a list of
+        routes overnight), not for chatting. Each message is answered in its
+        own fresh conversation. Tool results can't be sent back into a batch,
+        so replies that need tools finish with regular calls.
+
+        Args:
+            messages: The user messages/queries
+            poll_interval: Seconds between batch status checks
+
+        Returns:
+            One response string per message, in order
+        """
+        conversations = [Conversation() for _ in messages]
+        requests = []
+        for i, (message, conversation) in enumerate(zip(messages, conversations)):
+            await self._begin_turn(message, conversation)
+            requests.append({
+                "custom_id": f"msg-{i}",
+                "params": {
+                    "model": MODEL,
+                    "max_tokens": 1024,
+                    "system": self._system_prompt(conversation),
+                    "messages": list(conversation.messages),
+                    "tools": self.tools
+                }
+            })
+
+        batch = await self.client.messages.batches.create(requests=requests)
+        while batch.processing_status != "ended":
+            await asyncio.sleep(poll_interval)
+            batch = await self.client.messages.batches.retrieve(batch.id)
+
+        async def finish(entry) -> tuple:
+            i = int(entry.custom_id.removeprefix("msg-"))
+            if entry.result.type != "succeeded":
+                return i, f"Error processing request: batch request {entry.result.type}"
+            try:
+                return i, await self._complete_turn(
+                    entry.result.message, conversations[i], requests[i]["params"]["system"]
+                )
+            except Exception as e:
+                logger.exception("Error finishing batched request")
+                return i, f"Error processing request: {str(e)}"
+
+        # Replies that need tools finish concurrently; model_slots and
+        # tool_slots bound how many calls that puts in flight
+        entries = [entry async for entry in await self.client.messages.batches.results(batch.id)]
+        replies = [""] * len(messages)
+        for i, reply in await asyncio.gather(*(finish(entry) for entry in entries)):
+            replies[i] = reply
+        return replies
+
+    async def stream(self, message: str, conversation: Optional[Conversation] = None) -> AsyncIterator[str]:
+        """
+        Process a user message, yielding response text as Claude generates it.
+
+        Text Claude writes before calling a tool is streamed too, followed by a
+        blank line; only the final reply is kept in history.
+
+        Args:
+            message: The user's message/query
+            conversation: Conversation to use (default: the agent's own)
+
+        Yields:
+            Chunks of the agent's response
+        """
+        conversation = conversation if conversation is not None else self.conversation
+        await self._begin_turn(message, conversation)
+
+        try:
+            request = {
+                **self._first_call(message),
+                "system": self._system_prompt(conversation)
+            }
+            async for text in self._stream_turn(conversation, request):
+                yield text
+
+        except Exception as e:
+            logger.exception("Error processing request")
+            yield f"Error processing request: {str(e)}"
+
     def clear_history(self):
         """Clear conversation history."""
-        self.conversation_history = []
+        self.conversation = Conversation()
@@ -4,14 +4,45 @@ Tools package for Flub Agent
 Each tool provides specific functionality that the agent can use.
 """
 
-from .flight_search import search_flights, find_best_price
-from .x_api import (
-    search_user_tweets,
-    search_trending_topics,
-    search_topics,
-    analyze_tweet_sentiment
-)
-from .weather import check_weather
+import importlib
+
+from dotenv import load_dotenv
+
+# Load .env once for every tool module, before they read their credentials
+load_dotenv()
+
+# Tools are imported on first use, so a script that imports only one tool
+# module (e.g. flight search) doesn't pay for importing tweepy and the rest.
+# The agent still imports every tool up front for TOOL_FUNCTIONS, so the
+# first tool call of a request never waits on an import.
+_TOOL_MODULES = {
+    'search_flights': 'flight_search',
+    'find_best_price': 'flight_search',
+    'parse_price': 'flight_search',
+    'calculate_price_range': 'flight_search',
+    'find_shortest_duration': 'flight_search',
+    'compare_flight_options': 'flight_search',
+    'filter_flights_by_criteria': 'flight_search',
+    'search_user_tweets': 'x_api',
+    'search_trending_topics': 'x_api',
+    'search_topics': 'x_api',
+    'analyze_tweet_sentiment': 'x_api',
+    'check_weather': 'weather',
+}
+
+
+def __getattr__(name):
+    module = _TOOL_MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_TOOL_MODULES))
+
 
 __all__ = [
     # Flight search tools
@@ -5,45 +5,135 @@ Provides flight search functionality using the fast-flights library.
 Converted from fast-flights-mcp to be a direct tool.
 """
 
-from typing import Dict, Any
-from datetime import datetime
+from typing import Dict, Any, Optional
+from datetime import datetime, timedelta
+import os
 import re
+import functools
+import threading
+from cachetools import TTLCache
 from fast_flights import FlightData, Passengers, Result, get_flights
 
+try:
+    import diskcache
+except ImportError:  # Optional: only needed when FLIGHT_CACHE_DIR is set
+    diskcache = None
 
+# Seconds to reuse a search. Recent searches are shared by every flight tool
+# so a follow-up like "and the cheapest?" on the same route doesn't scrape
+# Google Flights again.
+FLIGHT_CACHE_TTL = 600
+_flights_lock = threading.Lock()
+_flights_cache = TTLCache(maxsize=512, ttl=FLIGHT_CACHE_TTL)
+
+# Optional on-disk cache behind the in-process one, so searches survive
+# restarts and are shared by processes on the same machine
+FLIGHT_CACHE_DIR = os.environ.get("FLIGHT_CACHE_DIR")
+_disk_cache = diskcache.Cache(FLIGHT_CACHE_DIR) if FLIGHT_CACHE_DIR and diskcache else None
+
+_DURATION_RE = re.compile(r'(\d+)\s*(hr|min)')
+_PRICE_STRIP = str.maketrans('', '', '$,')
+_IATA_RE = re.compile(r'[A-Z]{3}')
+
+
+def _fetch_flights(
+    date: str,
+    from_airport: str,
+    to_airport: str,
+    adults: int,
+    children: int,
+    infants_in_seat: int,
+    infants_on_lap: int,
+    refresh: bool = False
+) -> Result:
+    """
+    Fetch one-way economy flights, reusing results for FLIGHT_CACHE_TTL seconds.
+
+    Airport codes should already be upper-cased so equivalent queries share
+    an entry. Failed searches raise and are not cached. `refresh=True`
+    searches again and replaces the cached result.
+    """
+    key = (date, from_airport, to_airport, adults, children, infants_in_seat, infants_on_lap)
+    if not refresh:
+        with _flights_lock:
+            result = _flights_cache.get(key)
+        if result is None and _disk_cache is not None:
+            result = _disk_cache.get(key)
+            if result is not None:
+                with _flights_lock:
+                    _flights_cache[key] = result
+        if result is not None:
+            return result
+
+    result = get_flights(
+        flight_data=[FlightData(date=date, from_airport=from_airport, to_airport=to_airport)],
+        trip='one-way',
+        passengers=Passengers(
+            adults=adults,
+            children=children,
+            infants_in_seat=infants_in_seat,
+            infants_on_lap=infants_on_lap
+        ),
+        seat='economy'
+    )
+    with _flights_lock:
+        _flights_cache[key] = result
+    if _disk_cache is not None:
+        _disk_cache.set(key, result, expire=FLIGHT_CACHE_TTL)
+    return result
+
+
+def _query_error(date: str, from_airport: str, to_airport: str) -> Optional[str]:
+    """Why flights can't be searched for this query, or None if they can."""
+    for code in (from_airport, to_airport):
+        if not _IATA_RE.fullmatch(code):
+            return f"Invalid airport code {code!r}. Use a 3-letter IATA code like LAX"
+    try:
+        day = datetime.strptime(date, "%Y-%m-%d").date()
+    except ValueError as e:
+        return f"Invalid date format. Use YYYY-MM-DD: {str(e)}"
+    # A day of grace: the server's date can run ahead of the user's (e.g. a
+    # UTC server and a US user searching for today in their evening)
+    if day < datetime.now().date() - timedelta(days=1):
+        return f"{date} is in the past; only upcoming flights can be searched"
+    return None
+
+
+@functools.lru_cache(maxsize=4096)
 def parse_price(price_str: str) -> int:
     """Parse price string like '$121' or '$$121' to integer."""
     try:
-        return int(price_str.replace('$', '').replace(',', ''))
-    except:
+        # Nearly every price is a plain '$121'
+        if price_str[:1] == '$' and price_str[1:].isdecimal():
+            return int(price_str[1:])
+        return int(price_str.translate(_PRICE_STRIP))
+    except (ValueError, TypeError, AttributeError):
         return 0
 
 
+@functools.lru_cache(maxsize=4096)
 def parse_duration(duration_str: str) -> int:
     """Parse duration string like '1 hr 34 min' to total minutes."""
     try:
-        hours = 0
-        minutes = 0
-
-        hour_match = re.search(r'(\d+)\s*hr', duration_str)
-        if hour_match:
-            hours = int(hour_match.group(1))
-
-        min_match = re.search(r'(\d+)\s*min', duration_str)
-        if min_match:
-            minutes = int(min_match.group(1))
-
-        return hours * 60 + minutes
-    except:
+        total = 0
+        # One scan picks up both parts, e.g. ('1', 'hr') and ('34', 'min')
+        for amount, unit in _DURATION_RE.findall(duration_str):
+            total += int(amount) * (60 if unit == 'hr' else 1)
+        return total
+    except (ValueError, TypeError):
         return 0
 
 
 def calculate_price_range(flights: list) -> Dict[str, Any]:
     """Calculate price range from flight list."""
-    if not flights:
+    return _price_range([parse_price(f.price) for f in flights])
+
+
+def _price_range(prices: list) -> Dict[str, Any]:
+    """Price range of already-parsed prices."""
+    if not prices:
         return {"min": 0, "max": 0, "average": 0}
 
-    prices = [parse_price(f.price) for f in flights]
     return {
         "min": min(prices),
         "max": max(prices),
@@ -59,7 +149,8 @@ def search_flights(
     children: int = 0,
     infants_in_seat: int = 0,
     infants_on_lap: int = 0,
-    max_results: int = 10
+    max_results: int = 10,
+    refresh: bool = False
 ) -> Dict[str, Any]:
     """
     Search for flights between two airports on a specific date.
@@ -73,53 +164,47 @@ def search_flights(
         infants_in_seat: Number of infants in seat (default: 0)
         infants_on_lap: Number of infants on lap (default: 0)
         max_results: Maximum number of flights to return (default: 10)
+        refresh: Search again instead of reusing a recent result (default: False)
 
     Returns:
         Dictionary with flight search results including price, flight details, and metadata
     """
     try:
-        # Validate date format
-        datetime.strptime(date, "%Y-%m-%d")
-
-        # Create flight data and passengers objects
-        flight_data = FlightData(
-            date=date,
-            from_airport=from_airport.upper(),
-            to_airport=to_airport.upper()
-        )
-
-        passengers = Passengers(
-            adults=adults,
-            children=children,
-            infants_in_seat=infants_in_seat,
-            infants_on_lap=infants_on_lap
+        # Reject bad airports or dates without a network round trip
+        from_airport, to_airport = from_airport.strip().upper(), to_airport.strip().upper()
+        error = _query_error(date, from_airport, to_airport)
+        if error:
+            return {"success": False, "error": error}
+
+        result: Result = _fetch_flights(
+            date, from_airport, to_airport,
+            adults, children, infants_in_seat, infants_on_lap, refresh
         )
 
-        # Get flights using the API
-        result: Result = get_flights(
-            flight_data=[flight_data],
-            trip='one-way',
-            passengers=passengers,
-            seat='economy'
-        )
+        # Format response. Every flight in a result has the same type, so
+        # check once which optional fields this fast-flights version provides.
+        flights = result.flights[:max_results]
+        first = flights[0] if flights else None
+        has_departure_ahead = hasattr(first, 'departure_time_ahead')
+        has_arrival_ahead = hasattr(first, 'arrival_time_ahead')
+        has_delay = hasattr(first, 'delay')
 
-        # Format response
         flights_list = []
-        for i, flight in enumerate(result.flights[:max_results]):
+        for i, flight in enumerate(flights):
             flight_info = {
                 "rank": i + 1,
                 "name": flight.name,
                 "departure": flight.departure,
                 "arrival": flight.arrival,
-                "departure_time_ahead": getattr(flight, 'departure_time_ahead', None),
-                "arrival_time_ahead": getattr(flight, 'arrival_time_ahead', None),
+                "departure_time_ahead": flight.departure_time_ahead if has_departure_ahead else None,
+                "arrival_time_ahead": flight.arrival_time_ahead if has_arrival_ahead else None,
                 "duration": flight.duration,
                 "stops": flight.stops,
                 "price": flight.price,
                 "is_best": flight.is_best,
             }
 
-            if hasattr(flight, 'delay'):
+            if has_delay:
                 flight_info['delay'] = flight.delay
 
             flights_list.append(flight_info)
@@ -130,8 +215,8 @@ def search_flights(
             "success": True,
             "query": {
                 "date": date,
-                "from": from_airport.upper(),
-                "to": to_airport.upper(),
+                "from": from_airport,
+                "to": to_airport,
                 "passengers": {
                     "adults": adults,
                     "children": children,
@@ -146,8 +231,6 @@ def search_flights(
             "flights": flights_list
         }
 
-    except ValueError as e:
-        return {"success": False, "error": f"Invalid date format. Use YYYY-MM-DD: {str(e)}"}
     except Exception as e:
         return {"success": False, "error": f"Flight search failed: {str(e)}"}
 
@@ -159,7 +242,8 @@ def find_best_price(
     adults: int = 1,
     children: int = 0,
     infants_in_seat: int = 0,
-    infants_on_lap: int = 0
+    infants_on_lap: int = 0,
+    refresh: bool = False
 ) -> Dict[str, Any]:
     """
     Find the cheapest flight option for a given route and date.
@@ -172,42 +256,36 @@ def find_best_price(
         children: Number of child passengers (default: 0)
         infants_in_seat: Number of infants in seat (default: 0)
         infants_on_lap: Number of infants on lap (default: 0)
+        refresh: Search again instead of reusing a recent result (default: False)
 
     Returns:
         Dictionary with the cheapest flight details and pricing information
     """
     try:
-        flight_data = FlightData(
-            date=date,
-            from_airport=from_airport.upper(),
-            to_airport=to_airport.upper()
-        )
-
-        passengers = Passengers(
-            adults=adults,
-            children=children,
-            infants_in_seat=infants_in_seat,
-            infants_on_lap=infants_on_lap
-        )
-
-        result: Result = get_flights(
-            flight_data=[flight_data],
-            trip='one-way',
-            passengers=passengers,
-            seat='economy'
+        from_airport, to_airport = from_airport.strip().upper(), to_airport.strip().upper()
+        error = _query_error(date, from_airport, to_airport)
+        if error:
+            return {"success": False, "error": error}
+
+        result: Result = _fetch_flights(
+            date, from_airport, to_airport,
+            adults, children, infants_in_seat, infants_on_lap, refresh
         )
 
         if not result.flights:
             return {"success": False, "error": "No flights found"}
 
-        cheapest_flight = min(result.flights, key=lambda f: parse_price(f.price))
+        # Parse each price once for the minimum, range and average
+        prices = [parse_price(f.price) for f in result.flights]
+        price_range = _price_range(prices)
+        cheapest_flight = result.flights[prices.index(price_range["min"])]
 
         return {
             "success": True,
             "query": {
                 "date": date,
-                "from": from_airport.upper(),
-                "to": to_airport.upper()
+                "from": from_airport,
+                "to": to_airport
             },
             "cheapest_flight": {
                 "name": cheapest_flight.name,
@@ -220,11 +298,11 @@ def find_best_price(
             },
             "price_comparison": {
                 "current_price_indicator": result.current_price,
-                "price_range": calculate_price_range(result.flights),
+                "price_range": price_range,
                 "cheapest_price": cheapest_flight.price,
-                "average_price": round(sum(parse_price(f.price) for f in result.flights) / len(result.flights), 2)
+                "average_price": price_range["average"]
             }
-        }    
+        }
     except Exception as e:
         return {"success": False, "error": f"Failed to find best price: {str(e)}"}
 def find_shortest_duration(
@@ -234,7 +312,8 @@ def find_shortest_duration(
     adults: int = 1,
     children: int = 0,
     infants_in_seat: int = 0,
-    infants_on_lap: int = 0
+    infants_on_lap: int = 0,
+    refresh: bool = False
 ) -> Dict[str, Any]:
     """
     Find the flight with the shortest duration for a given route and date.
@@ -247,62 +326,51 @@ def find_shortest_duration(
         children: Number of child passengers (default: 0)
         infants_in_seat: Number of infants in seat (default: 0)
         infants_on_lap: Number of infants on lap (default: 0)
+        refresh: Search again instead of reusing a recent result (default: False)
 
     Returns:
         Dictionary with the fastest flight details
     """
     try:
-        # Create flight data and passengers objects
-        flight_data = FlightData(
-            date=date,
-            from_airport=from_airport.upper(),
-            to_airport=to_airport.upper()
-        )
-
-        passengers = Passengers(
-            adults=adults,
-            children=children,
-            infants_in_seat=infants_in_seat,
-            infants_on_lap=infants_on_lap
-        )
-
-        # Get flights using the correct API
-        result: Result = get_flights(
-            flight_data=[flight_data],  # Must be a list
-            trip='one-way',
-            passengers=passengers,
-            seat='economy'
+        from_airport, to_airport = from_airport.strip().upper(), to_airport.strip().upper()
+        error = _query_error(date, from_airport, to_airport)
+        if error:
+            return {"success": False, "error": error}
+
+        result: Result = _fetch_flights(
+            date, from_airport, to_airport,
+            adults, children, infants_in_seat, infants_on_lap, refresh
         )
 
         if not result.flights:
             return {"success": False, "error": "No flights found"}
 
-        # Find shortest duration flight (parse duration strings for comparison)
-        fastest_flight = min(result.flights, key=lambda f: parse_duration(f.duration))
-
-        # Calculate average duration in minutes
-        avg_duration_minutes = sum(parse_duration(f.duration) for f in result.flights) / len(result.flights)
+        # Parse each duration once for the minimum and average
+        durations = [parse_duration(f.duration) for f in result.flights]
+        fastest_minutes = min(durations)
+        fastest_flight = result.flights[durations.index(fastest_minutes)]
+        avg_duration_minutes = sum(durations) / len(durations)
 
         return {
             "success": True,
             "query": {
                 "date": date,
-                "from": from_airport.upper(),
-                "to": to_airport.upper()
+                "from": from_airport,
+                "to": to_airport
             },
             "fastest_flight": {
                 "name": fastest_flight.name,
                 "departure": fastest_flight.departure,
                 "arrival": fastest_flight.arrival,
                 "duration": fastest_flight.duration,
-                "duration_minutes": parse_duration(fastest_flight.duration),
+                "duration_minutes": fastest_minutes,
                 "stops": fastest_flight.stops,
                 "price": fastest_flight.price,
                 "is_best": fastest_flight.is_best
             },
             "duration_comparison": {
                 "fastest_duration": fastest_flight.duration,
-                "fastest_duration_minutes": parse_duration(fastest_flight.duration),
+                "fastest_duration_minutes": fastest_minutes,
                 "average_duration_minutes": round(avg_duration_minutes, 1)
             }
         }
@@ -317,7 +385,8 @@ def compare_flight_options(
     adults: int = 1,
     children: int = 0,
     infants_in_seat: int = 0,
-    infants_on_lap: int = 0
+    infants_on_lap: int = 0,
+    refresh: bool = False
 ) -> Dict[str, Any]:
     """
     Compare different flight options and provide a comprehensive analysis.
@@ -331,57 +400,49 @@ def compare_flight_options(
         children: Number of child passengers (default: 0)
         infants_in_seat: Number of infants in seat (default: 0)
         infants_on_lap: Number of infants on lap (default: 0)
+        refresh: Search again instead of reusing a recent result (default: False)
 
     Returns:
         Dictionary with comprehensive flight comparison analysis
     """
     try:
-        # Create flight data and passengers objects
-        flight_data = FlightData(
-            date=date,
-            from_airport=from_airport.upper(),
-            to_airport=to_airport.upper()
-        )
-
-        passengers = Passengers(
-            adults=adults,
-            children=children,
-            infants_in_seat=infants_in_seat,
-            infants_on_lap=infants_on_lap
-        )
-
-        # Get flights using the correct API
-        result: Result = get_flights(
-            flight_data=[flight_data],  # Must be a list
-            trip='one-way',
-            passengers=passengers,
-            seat='economy'
+        from_airport, to_airport = from_airport.strip().upper(), to_airport.strip().upper()
+        error = _query_error(date, from_airport, to_airport)
+        if error:
+            return {"success": False, "error": error}
+
+        result: Result = _fetch_flights(
+            date, from_airport, to_airport,
+            adults, children, infants_in_seat, infants_on_lap, refresh
         )
 
         if not result.flights:
             return {"success": False, "error": "No flights found"}
 
+        # Parse each price and duration once; every statistic below uses these
+        prices = [parse_price(f.price) for f in result.flights]
+        durations = [parse_duration(f.duration) for f in result.flights]
+        price_range = _price_range(prices)
+        fastest_minutes, slowest_minutes = min(durations), max(durations)
+
         # Find best options
-        cheapest_flight = min(result.flights, key=lambda f: parse_price(f.price))
-        fastest_flight = min(result.flights, key=lambda f: parse_duration(f.duration))
+        cheapest_flight = result.flights[prices.index(price_range["min"])]
+        fastest_flight = result.flights[durations.index(fastest_minutes)]
         best_flights = [f for f in result.flights if f.is_best]
 
         # Calculate statistics
-        avg_price = sum(parse_price(f.price) for f in result.flights) / len(result.flights)
-        avg_duration_minutes = sum(parse_duration(f.duration) for f in result.flights) / len(result.flights)
+        avg_price = price_range["average"]
+        avg_duration_minutes = sum(durations) / len(durations)
 
         # Direct flights (0 stops)
         direct_flights = [f for f in result.flights if f.stops == 0]
 
-        # Calculate price range
-        price_range = calculate_price_range(result.flights)
-
         return {
             "success": True,
             "query": {
                 "date": date,
-                "from": from_airport.upper(),
-                "to": to_airport.upper(),
+                "from": from_airport,
+                "to": to_airport,
                 "passengers": {
                     "adults": adults,
                     "children": children,
@@ -428,11 +489,8 @@ def compare_flight_options(
             "statistics": {
                 "average_price": round(avg_price, 2),
                 "average_duration_minutes": round(avg_duration_minutes, 1),
-                "price_difference": round(max(parse_price(f.price) for f in result.flights) - min(parse_price(f.price) for f in result.flights), 2),
-                "duration_difference_minutes": round(
-                    max(parse_duration(f.duration) for f in result.flights) -
-                    min(parse_duration(f.duration) for f in result.flights), 1
-                )
+                "price_difference": round(price_range["max"] - price_range["min"], 2),
+                "duration_difference_minutes": round(slowest_minutes - fastest_minutes, 1)
             }
         }
 
@@ -450,7 +508,8 @@ def filter_flights_by_criteria(
     adults: int = 1,
     children: int = 0,
     infants_in_seat: int = 0,
-    infants_on_lap: int = 0
+    infants_on_lap: int = 0,
+    refresh: bool = False
 ) -> Dict[str, Any]:
     """
     Filter flights based on specific criteria like price, duration, and stops.
@@ -467,50 +526,34 @@ def filter_flights_by_criteria(
         children: Number of child passengers (default: 0)
         infants_in_seat: Number of infants in seat (default: 0)
         infants_on_lap: Number of infants on lap (default: 0)
+        refresh: Search again instead of reusing a recent result (default: False)
 
     Returns:
         Dictionary with filtered flight results
     """
     try:
-        # Create flight data and passengers objects
-        flight_data = FlightData(
-            date=date,
-            from_airport=from_airport.upper(),
-            to_airport=to_airport.upper()
-        )
-
-        passengers = Passengers(
-            adults=adults,
-            children=children,
-            infants_in_seat=infants_in_seat,
-            infants_on_lap=infants_on_lap
-        )
-
-        # Get flights using the correct API
-        result: Result = get_flights(
-            flight_data=[flight_data],  # Must be a list
-            trip='one-way',
-            passengers=passengers,
-            seat='economy'
+        from_airport, to_airport = from_airport.strip().upper(), to_airport.strip().upper()
+        error = _query_error(date, from_airport, to_airport)
+        if error:
+            return {"success": False, "error": error}
+
+        result: Result = _fetch_flights(
+            date, from_airport, to_airport,
+            adults, children, infants_in_seat, infants_on_lap, refresh
         )
 
         if not result.flights:
             return {"success": False, "error": "No flights found"}
 
-        # Apply filters
-        filtered_flights = result.flights
-
-        if max_price is not None:
-            filtered_flights = [f for f in filtered_flights if f.price <= max_price]
-
-        if max_duration is not None:
-            filtered_flights = [f for f in filtered_flights if f.duration <= max_duration]
-
-        if max_stops is not None:
-            filtered_flights = [f for f in filtered_flights if f.stops <= max_stops]
-
-        if direct_only:
-            filtered_flights = [f for f in filtered_flights if f.stops == 0]
+        # Apply every filter in one pass. Prices and durations are strings
+        # like '$121' and '1 hr 34 min', so compare their parsed values.
+        filtered_flights = [
+            f for f in result.flights
+            if (max_price is None or parse_price(f.price) <= max_price)
+            and (max_duration is None or parse_duration(f.duration) <= max_duration)
+            and (max_stops is None or f.stops <= max_stops)
+            and (not direct_only or f.stops == 0)
+        ]
 
         # Format results
         flights_list = [
@@ -530,8 +573,8 @@ def filter_flights_by_criteria(
             "success": True,
             "query": {
                 "date": date,
-                "from": from_airport.upper(),
-                "to": to_airport.upper()
+                "from": from_airport,
+                "to": to_airport
             },
             "filters_applied": {
                 "max_price": max_price,
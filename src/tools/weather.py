@@ -1,9 +1,18 @@
 import os
+import orjson
 import requests
-from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-# Load environment variables
-load_dotenv()
+WEATHER_API_KEY = os.environ.get("WEATHER_API_KEY")
+
+# One session for every lookup so connections to the weather API are kept
+# alive instead of reconnecting each time
+_session = requests.Session()
+_session.mount("http://", HTTPAdapter(
+    pool_maxsize=10,
+    max_retries=Retry(total=2, backoff_factor=0.1)
+))
 
 def check_weather(city: str) -> dict:
     """
@@ -19,26 +28,27 @@ def check_weather(city: str) -> dict:
         ValueError: If WEATHER_API_KEY is not set
         requests.exceptions.RequestException: If the API request fails
     """
-    api_key = os.getenv("WEATHER_API_KEY")
+    api_key = WEATHER_API_KEY
     if not api_key:
         raise ValueError("WEATHER_API_KEY environment variable is not set")
         
     base_url = "http://api.weatherapi.com/v1/current.json"
     
     # Make the request
-    response = requests.get(
+    response = _session.get(
         base_url,
         params={
             "key": api_key,
             "q": city
-        }
+        },
+        timeout=5
     )
     
     # Raise an exception for bad status codes
     response.raise_for_status()
     
     # Return the weather data
-    return response.json()
+    return orjson.loads(response.content)
 
 # Example usage:
 # weather_data = check_weather("London")
@@ -6,12 +6,19 @@ Converted from X-mcp to be a direct tool for flub-agent.
 """
 
 import os
+import functools
+import hashlib
+import threading
 from typing import Dict, Any
-from dotenv import load_dotenv
+from cachetools import TTLCache
+from cachetools.keys import hashkey
+import orjson
 import tweepy
 
-# Load environment variables
-load_dotenv()
+try:
+    import redis
+except ImportError:  # Optional: only needed when REDIS_URL is set
+    redis = None
 
 # Get X API credentials from environment variables
 BEARER_TOKEN = os.environ.get("X_BEARER_TOKEN")
@@ -20,9 +27,86 @@ API_SECRET = os.environ.get("X_API_SECRET")
 ACCESS_TOKEN = os.environ.get("X_ACCESS_TOKEN")
 ACCESS_TOKEN_SECRET = os.environ.get("X_ACCESS_TOKEN_SECRET")
 
+# Short-lived response caches so identical lookups seconds apart don't each
+# spend an X API call. User timelines change slowly, so they keep longer.
+_cache_lock = threading.Lock()
+_user_tweets_cache = TTLCache(maxsize=1024, ttl=300)
+_search_cache = TTLCache(maxsize=4096, ttl=60)
 
+# Optional shared cache behind the in-process one, so several processes make
+# one upstream call per TTL instead of one each
+REDIS_URL = os.environ.get("REDIS_URL")
+_redis = redis.Redis.from_url(REDIS_URL) if REDIS_URL and redis else None
+
+
+def _redis_get(key: str):
+    """Read a cached result from Redis; any Redis problem counts as a miss."""
+    try:
+        value = _redis.get(key)
+    except redis.RedisError:
+        return None
+    return orjson.loads(value) if value is not None else None
+
+
+def _redis_set(key: str, result: Dict[str, Any], ttl: float):
+    """Store a result in Redis, ignoring Redis errors."""
+    try:
+        _redis.set(key, orjson.dumps(result), ex=int(ttl))
+    except redis.RedisError:
+        pass
+
+
+def _cache_success(cache: TTLCache):
+    """
+    Memoize successful results in `cache`, keyed by the call's arguments.
+
+    When REDIS_URL is set, Redis is checked after an in-process miss and
+    written with the same TTL.
+
+    The wrapped function also accepts `refresh=True` to bypass the cached
+    entry and fetch fresh data (the new result replaces the old one).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, refresh: bool = False, **kwargs):
+            # Functions share caches, so the name is part of the key
+            key = hashkey(func.__name__, *args, **kwargs)
+            redis_key = None
+            if _redis is not None:
+                digest = hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+                redis_key = f"x:{func.__name__}:{digest}"
+
+            if not refresh:
+                with _cache_lock:
+                    cached = cache.get(key)
+                if cached is None and redis_key:
+                    cached = _redis_get(redis_key)
+                    if cached is not None:
+                        with _cache_lock:
+                            cache[key] = cached
+                if cached is not None:
+                    return cached
+
+            result = func(*args, **kwargs)
+            # Errors (rate limits, bad credentials) are not cached
+            if result.get("success"):
+                with _cache_lock:
+                    cache[key] = result
+                if redis_key:
+                    _redis_set(redis_key, result, cache.ttl)
+            return result
+        return wrapper
+    return decorator
+
+
+@functools.lru_cache(maxsize=1)
 def get_twitter_client() -> tweepy.Client:
-    """Initialize and return Twitter API client."""
+    """
+    Return the shared Twitter API client, creating it on first use.
+
+    Reusing one client keeps its HTTP connections open between tool calls.
+    A missing token raises every time, since failures are not cached.
+    """
     if not BEARER_TOKEN:
         raise ValueError(
             "X_BEARER_TOKEN environment variable is required. "
@@ -39,6 +123,16 @@ def get_twitter_client() -> tweepy.Client:
     )
 
 
+@functools.lru_cache(maxsize=1)
+def _get_v1_api() -> tweepy.API:
+    """Return the shared v1.1 API client (needed for trends), creating it on first use."""
+    auth = tweepy.OAuth1UserHandler(
+        API_KEY, API_SECRET, ACCESS_TOKEN, ACCESS_TOKEN_SECRET
+    )
+    return tweepy.API(auth)
+
+
+@_cache_success(_user_tweets_cache)
 def search_user_tweets(
     username: str,
     max_results: int = 10
@@ -101,6 +195,7 @@ def search_user_tweets(
         return {"success": False, "error": str(e)}
 
 
+@_cache_success(_search_cache)
 def search_trending_topics(
     woeid: int = 1  # 1 = Worldwide
 ) -> Dict[str, Any]:
@@ -125,12 +220,7 @@ def search_trending_topics(
             }
         
         # Use API v1.1 for trends
-        auth = tweepy.OAuth1UserHandler(
-            API_KEY, API_SECRET, ACCESS_TOKEN, ACCESS_TOKEN_SECRET
-        )
-        api = tweepy.API(auth)
-        
-        trends = api.get_place_trends(id=woeid)
+        trends = _get_v1_api().get_place_trends(id=woeid)
         
         if not trends:
             return {"success": False, "error": "No trends found"}
@@ -155,6 +245,7 @@ def search_trending_topics(
         return {"success": False, "error": str(e)}
 
 
+@_cache_success(_search_cache)
 def search_topics(
     query: str,
     max_results: int = 10,
@@ -226,10 +317,10 @@ def search_topics(
 def analyze_tweet_sentiment(tweets_data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Analyze sentiment and engagement metrics from tweet search results.
-    
+
     Args:
         tweets_data: Output from search_topics or search_user_tweets
-    
+
     Returns:
         Dictionary with sentiment analysis and engagement metrics
     """
@@ -239,23 +330,28 @@ def analyze_tweet_sentiment(tweets_data: Dict[str, Any]) -> Dict[str, Any]:
                 "success": False,
                 "error": "No valid tweets data provided"
             }
-        
+
         tweets = tweets_data["tweets"]
         total_tweets = len(tweets)
-        
-        # Calculate engagement metrics
-        total_likes = sum(t.get("likes", 0) for t in tweets)
-        total_retweets = sum(t.get("retweets", 0) for t in tweets)
-        total_replies = sum(t.get("replies", 0) for t in tweets)
-        
+
+        # Calculate engagement metrics and find the top engaged tweet in one pass
+        total_likes = total_retweets = total_replies = 0
+        top_tweet = None
+        top_engagement = -1
+        for t in tweets:
+            likes = t.get("likes", 0)
+            retweets = t.get("retweets", 0)
+            total_likes += likes
+            total_retweets += retweets
+            total_replies += t.get("replies", 0)
+            if likes + retweets > top_engagement:
+                top_tweet, top_engagement = t, likes + retweets
+
         # Calculate averages
         avg_likes = round(total_likes / total_tweets, 2) if total_tweets > 0 else 0
         avg_retweets = round(total_retweets / total_tweets, 2) if total_tweets > 0 else 0
         avg_replies = round(total_replies / total_tweets, 2) if total_tweets > 0 else 0
-        
-        # Find top engaged tweet
-        top_tweet = max(tweets, key=lambda t: t.get("likes", 0) + t.get("retweets", 0)) if tweets else None
-        
+
         return {
             "success": True,
             "query": tweets_data.get("query"),
@@ -275,7 +371,6 @@ def analyze_tweet_sentiment(tweets_data: Dict[str, Any]) -> Dict[str, Any]:
                 "author": top_tweet.get("author") if top_tweet else None,
             } if top_tweet else None
         }
-    
+
     except Exception as e:
         return {"success": False, "error": f"Analysis failed: {str(e)}"}
-
@@ -0,0 +1,61 @@
+import os
+
+os.environ.setdefault("SESSION_DB_PATH", ":memory:")
+
+import agent_server  # noqa: E402
+
+
+def test_load_conversation_prefers_pending_save(monkeypatch):
+    monkeypatch.setattr(agent_server, "pending_saves", {})
+    conversation = agent_server.Conversation(messages=[
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "Hello!"},
+    ], summary="Earlier chat.")
+    agent_server.queue_save("+15550001", conversation)
+
+    loaded = agent_server.load_conversation("+15550001")
+
+    assert loaded.messages == conversation.messages
+    assert loaded.messages is not conversation.messages
+    assert loaded.summary == "Earlier chat."
+
+
+def test_queue_save_drops_turn_that_errored(monkeypatch):
+    monkeypatch.setattr(agent_server, "pending_saves", {})
+    conversation = agent_server.Conversation(messages=[
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "Hello!"},
+        {"role": "user", "content": "flights to LAX?"},
+    ])
+    agent_server.queue_save("+15550002", conversation)
+
+    loaded = agent_server.load_conversation("+15550002")
+
+    assert loaded.messages == conversation.messages[:2]
+
+
+def test_load_conversation_falls_back_to_store(monkeypatch):
+    monkeypatch.setattr(agent_server, "pending_saves", {})
+    agent_server.store.save("+15550003", [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "Hello!"},
+    ], "")
+
+    loaded = agent_server.load_conversation("+15550003")
+
+    assert [m["content"] for m in loaded.messages] == ["hi", "Hello!"]
+
+
+def test_query_stream_reports_failure_as_error_event(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    async def broken_agent():
+        raise RuntimeError("agent failed to start")
+
+    monkeypatch.setattr(agent_server, "get_agent", broken_agent)
+    response = TestClient(agent_server.app).post(
+        "/query_stream", json={"sender": "+15550004", "query": "hi"}
+    )
+
+    assert response.status_code == 200
+    assert response.text == 'data: {"error":"agent failed to start"}\n\n'
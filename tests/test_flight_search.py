@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+from src.tools.flight_search import _query_error, parse_duration, parse_price
+
+
+def _day(offset: int) -> str:
+    return (datetime.now().date() + timedelta(days=offset)).strftime("%Y-%m-%d")
+
+
+def test_query_error_accepts_upcoming_search():
+    assert _query_error(_day(7), "SFO", "JFK") is None
+
+
+def test_query_error_rejects_bad_airport_codes():
+    assert "Invalid airport code 'sfo'" in _query_error(_day(7), "sfo", "JFK")
+    assert "Invalid airport code 'JFKX'" in _query_error(_day(7), "SFO", "JFKX")
+
+
+def test_query_error_rejects_bad_date_format():
+    assert _query_error("12/25/2030", "SFO", "JFK").startswith("Invalid date format")
+
+
+def test_query_error_allows_a_day_of_grace():
+    assert _query_error(_day(0), "SFO", "JFK") is None
+    assert _query_error(_day(-1), "SFO", "JFK") is None
+    assert "in the past" in _query_error(_day(-2), "SFO", "JFK")
+
+
+def test_parse_price():
+    assert parse_price("$121") == 121
+    assert parse_price("$$121") == 121
+    assert parse_price("$1,204") == 1204
+    assert parse_price("Price unavailable") == 0
+    assert parse_price("") == 0
+    assert parse_price(None) == 0
+
+
+def test_parse_duration():
+    assert parse_duration("1 hr 34 min") == 94
+    assert parse_duration("5 hr") == 300
+    assert parse_duration("45 min") == 45
+    assert parse_duration("") == 0
+    assert parse_duration(None) == 0
@@ -0,0 +1,58 @@
+from src.session_store import SQLiteSessionStore
+
+TOOL_USE = {"role": "assistant", "content": [
+    {"type": "tool_use", "id": "toolu_1", "name": "check_weather", "input": {"city": "Austin"}}
+]}
+TOOL_RESULT = {"role": "user", "content": [
+    {"type": "tool_result", "tool_use_id": "toolu_1", "content": "{}"}
+]}
+
+
+def test_complete_turns_keeps_finished_turns():
+    messages = [
+        {"role": "user", "content": "weather in Austin?"},
+        TOOL_USE,
+        TOOL_RESULT,
+        {"role": "assistant", "content": "Sunny."},
+    ]
+    assert SQLiteSessionStore._complete_turns(messages) == messages
+
+
+def test_complete_turns_drops_unfinished_trailing_turn():
+    messages = [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "Hello!"},
+        {"role": "user", "content": "weather in Austin?"},
+        TOOL_USE,
+        TOOL_RESULT,
+    ]
+    assert SQLiteSessionStore._complete_turns(messages) == messages[:2]
+
+
+def test_complete_turns_drops_leading_orphans():
+    messages = [
+        TOOL_RESULT,
+        {"role": "assistant", "content": "Sunny."},
+        {"role": "user", "content": "thanks"},
+        {"role": "assistant", "content": "Anytime!"},
+    ]
+    assert SQLiteSessionStore._complete_turns(messages) == messages[2:]
+
+
+def test_complete_turns_empty_without_a_reply():
+    assert SQLiteSessionStore._complete_turns([{"role": "user", "content": "hi"}]) == []
+    assert SQLiteSessionStore._complete_turns([]) == []
+
+
+def test_save_and_load_round_trip_tool_blocks():
+    store = SQLiteSessionStore(":memory:")
+    messages = [
+        {"role": "user", "content": "weather in Austin?"},
+        TOOL_USE,
+        TOOL_RESULT,
+        {"role": "assistant", "content": "Sunny."},
+    ]
+    store.save("+15550001", messages, "Summary.")
+    assert store.load("+15550001") == (messages, "Summary.")
+    assert store.clear("+15550001")
+    assert store.load("+15550001") == ([], "")
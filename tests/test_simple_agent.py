@@ -0,0 +1,40 @@
+import asyncio
+
+from src.conversation import Conversation
+from src.simple_agent import MAX_HISTORY_TOKENS, SimpleFlubAgent
+
+
+class _FailingMessages:
+    """Stands in for client.messages; any summary call fails the test."""
+
+    async def create(self, **kwargs):
+        raise AssertionError("history should not have been summarized")
+
+
+def _tool_turn(question, result):
+    return [
+        {"role": "user", "content": question},
+        {"role": "assistant", "content": [
+            {"type": "tool_use", "id": "toolu_1", "name": "search_flights", "input": {"origin": "SFO"}}
+        ]},
+        {"role": "user", "content": [
+            {"type": "tool_result", "tool_use_id": "toolu_1", "content": result}
+        ]},
+        {"role": "assistant", "content": "Here are the flights."},
+    ]
+
+
+def test_huge_old_tool_result_is_elided_not_summarized():
+    agent = SimpleFlubAgent(api_key="test")
+    agent.client.messages = _FailingMessages()
+    huge = "x" * (MAX_HISTORY_TOKENS * 4 * 2)
+    conversation = Conversation(messages=_tool_turn("flights SFO to JFK?", huge) + [
+        {"role": "user", "content": "thanks"},
+        {"role": "assistant", "content": "Anytime!"},
+    ])
+
+    asyncio.run(agent._compact_history(conversation))
+
+    assert conversation.summary == ""
+    assert len(conversation.messages) == 6
+    assert conversation.messages[2]["content"][0]["content"] == "[prior search_flights result omitted]"